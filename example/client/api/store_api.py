@@ -1,144 +1,8 @@
 # flake8: noqa E501
-from asyncio import get_event_loop
-from enum import Enum
-from pathlib import PurePath
-from types import GeneratorType
-from typing import TYPE_CHECKING, Any, Awaitable, Callable, Dict, List, Set, Tuple, Union
-
-from pydantic.json import ENCODERS_BY_TYPE
-from pydantic.main import BaseModel
+from typing import TYPE_CHECKING, Any, Dict
 
 from example.client import models as m
-
-SetIntStr = Set[Union[int, str]]
-DictIntStrAny = Dict[Union[int, str], Any]
-
-
-def generate_encoders_by_class_tuples(type_encoder_map: Dict[Any, Callable]) -> Dict[Callable, Tuple]:
-    encoders_by_classes: Dict[Callable, List] = {}
-    for type_, encoder in type_encoder_map.items():
-        encoders_by_classes.setdefault(encoder, []).append(type_)
-    encoders_by_class_tuples: Dict[Callable, Tuple] = {}
-    for encoder, classes in encoders_by_classes.items():
-        encoders_by_class_tuples[encoder] = tuple(classes)
-    return encoders_by_class_tuples
-
-
-encoders_by_class_tuples = generate_encoders_by_class_tuples(ENCODERS_BY_TYPE)
-
-
-def jsonable_encoder(
-    obj: Any,
-    include: Union[SetIntStr, DictIntStrAny] = None,
-    exclude=None,
-    by_alias: bool = True,
-    skip_defaults: bool = None,
-    exclude_unset: bool = False,
-    include_none: bool = True,
-    custom_encoder=None,
-    sqlalchemy_safe: bool = True,
-) -> Any:
-    if exclude is None:
-        exclude = set()
-    if custom_encoder is None:
-        custom_encoder = {}
-    if include is not None and not isinstance(include, set):
-        include = set(include)
-    if exclude is not None and not isinstance(exclude, set):
-        exclude = set(exclude)
-    if isinstance(obj, BaseModel):
-        encoder = getattr(obj.Config, "json_encoders", {})
-        if custom_encoder:
-            encoder.update(custom_encoder)
-        obj_dict = obj.dict(
-            include=include, exclude=exclude, by_alias=by_alias, exclude_unset=bool(exclude_unset or skip_defaults),
-        )
-
-        return jsonable_encoder(
-            obj_dict, include_none=include_none, custom_encoder=encoder, sqlalchemy_safe=sqlalchemy_safe,
-        )
-    if isinstance(obj, Enum):
-        return obj.value
-    if isinstance(obj, PurePath):
-        return str(obj)
-    if isinstance(obj, (str, int, float, type(None))):
-        return obj
-    if isinstance(obj, dict):
-        encoded_dict = {}
-        for key, value in obj.items():
-            if (
-                (not sqlalchemy_safe or (not isinstance(key, str)) or (not key.startswith("_sa")))
-                and (value is not None or include_none)
-                and ((include and key in include) or key not in exclude)
-            ):
-                encoded_key = jsonable_encoder(
-                    key,
-                    by_alias=by_alias,
-                    exclude_unset=exclude_unset,
-                    include_none=include_none,
-                    custom_encoder=custom_encoder,
-                    sqlalchemy_safe=sqlalchemy_safe,
-                )
-                encoded_value = jsonable_encoder(
-                    value,
-                    by_alias=by_alias,
-                    exclude_unset=exclude_unset,
-                    include_none=include_none,
-                    custom_encoder=custom_encoder,
-                    sqlalchemy_safe=sqlalchemy_safe,
-                )
-                encoded_dict[encoded_key] = encoded_value
-        return encoded_dict
-    if isinstance(obj, (list, set, frozenset, GeneratorType, tuple)):
-        encoded_list = []
-        for item in obj:
-            encoded_list.append(
-                jsonable_encoder(
-                    item,
-                    include=include,
-                    exclude=exclude,
-                    by_alias=by_alias,
-                    exclude_unset=exclude_unset,
-                    include_none=include_none,
-                    custom_encoder=custom_encoder,
-                    sqlalchemy_safe=sqlalchemy_safe,
-                )
-            )
-        return encoded_list
-
-    if custom_encoder:
-        if type(obj) in custom_encoder:
-            return custom_encoder[type(obj)](obj)
-        else:
-            for encoder_type, encoder in custom_encoder.items():
-                if isinstance(obj, encoder_type):
-                    return encoder(obj)
-
-    if type(obj) in ENCODERS_BY_TYPE:
-        return ENCODERS_BY_TYPE[type(obj)](obj)
-    for encoder, classes_tuple in encoders_by_class_tuples.items():
-        if isinstance(obj, classes_tuple):
-            return encoder(obj)
-
-    errors: List[Exception] = []
-    try:
-        data = dict(obj)
-    except Exception as e:
-        errors.append(e)
-        try:
-            data = vars(obj)
-        except Exception as e:
-            errors.append(e)
-            raise ValueError(errors)
-    return jsonable_encoder(
-        data,
-        by_alias=by_alias,
-        exclude_unset=exclude_unset,
-        include_none=include_none,
-        custom_encoder=custom_encoder,
-        sqlalchemy_safe=sqlalchemy_safe,
-    )
-
+from example.client.tracing import BUILD
 
 if TYPE_CHECKING:
     from example.client.api_client import ApiClient
@@ -148,38 +12,53 @@ class _StoreApi:
     def __init__(self, api_client: "ApiClient"):
         self.api_client = api_client
 
-    def _build_for_delete_order(self, order_id: int) -> Awaitable[None]:
+    def _build_for_delete_order(self, order_id: int) -> Dict[str, Any]:
         """
         For valid response try integer IDs with positive integer value. Negative or non-integer values will generate API errors
         """
         path_params = {"orderId": str(order_id)}
 
-        return self.api_client.request(
-            type_=None, method="DELETE", url="/store/order/{orderId}", path_params=path_params,
+        return dict(
+            type_=None,
+            method="DELETE",
+            url="/store/order/{orderId}",
+            operation_id="delete_order",
+            path_params=path_params,
         )
 
     def _build_for_get_inventory(
         self,
-    ) -> Awaitable[Dict[str, int]]:
+    ) -> Dict[str, Any]:
         """
         Returns a map of status codes to quantities
         """
-        return self.api_client.request(type_=Dict[str, int], method="GET", url="/store/inventory",)
+        return dict(type_=Dict[str, int], method="GET", url="/store/inventory", operation_id="get_inventory",)
 
-    def _build_for_get_order_by_id(self, order_id: int) -> Awaitable[m.Order]:
+    def _build_for_get_order_by_id(self, order_id: int) -> Dict[str, Any]:
         """
         For valid response try integer IDs with value >= 1 and <= 10. Other values will generated exceptions
         """
         path_params = {"orderId": str(order_id)}
 
-        return self.api_client.request(
-            type_=m.Order, method="GET", url="/store/order/{orderId}", path_params=path_params,
+        return dict(
+            type_=m.Order,
+            method="GET",
+            url="/store/order/{orderId}",
+            operation_id="get_order_by_id",
+            path_params=path_params,
         )
 
-    def _build_for_place_order(self, body: m.Order) -> Awaitable[m.Order]:
-        body = jsonable_encoder(body)
+    def _build_for_place_order(self, body: m.Order) -> Dict[str, Any]:
+        headers = {"Content-Type": "application/json"}
 
-        return self.api_client.request(type_=m.Order, method="POST", url="/store/order", json=body)
+        return dict(
+            type_=m.Order,
+            method="POST",
+            url="/store/order",
+            operation_id="place_order",
+            headers=headers,
+            json_body=body,
+        )
 
 
 class AsyncStoreApi(_StoreApi):
@@ -187,7 +66,9 @@ class AsyncStoreApi(_StoreApi):
         """
         For valid response try integer IDs with positive integer value. Negative or non-integer values will generate API errors
         """
-        return await self._build_for_delete_order(order_id=order_id)
+        with self.api_client.stage(BUILD, "delete_order"):
+            kwargs = self._build_for_delete_order(order_id=order_id)
+        return await self.api_client.request(**kwargs)
 
     async def get_inventory(
         self,
@@ -195,16 +76,22 @@ class AsyncStoreApi(_StoreApi):
         """
         Returns a map of status codes to quantities
         """
-        return await self._build_for_get_inventory()
+        with self.api_client.stage(BUILD, "get_inventory"):
+            kwargs = self._build_for_get_inventory()
+        return await self.api_client.request(**kwargs)
 
     async def get_order_by_id(self, order_id: int) -> m.Order:
         """
         For valid response try integer IDs with value >= 1 and <= 10. Other values will generated exceptions
         """
-        return await self._build_for_get_order_by_id(order_id=order_id)
+        with self.api_client.stage(BUILD, "get_order_by_id"):
+            kwargs = self._build_for_get_order_by_id(order_id=order_id)
+        return await self.api_client.request(**kwargs)
 
     async def place_order(self, body: m.Order) -> m.Order:
-        return await self._build_for_place_order(body=body)
+        with self.api_client.stage(BUILD, "place_order"):
+            kwargs = self._build_for_place_order(body=body)
+        return await self.api_client.request(**kwargs)
 
 
 class SyncStoreApi(_StoreApi):
@@ -212,8 +99,9 @@ class SyncStoreApi(_StoreApi):
         """
         For valid response try integer IDs with positive integer value. Negative or non-integer values will generate API errors
         """
-        coroutine = self._build_for_delete_order(order_id=order_id)
-        return get_event_loop().run_until_complete(coroutine)
+        with self.api_client.stage(BUILD, "delete_order"):
+            kwargs = self._build_for_delete_order(order_id=order_id)
+        return self.api_client.request_sync(**kwargs)
 
     def get_inventory(
         self,
@@ -221,16 +109,19 @@ class SyncStoreApi(_StoreApi):
         """
         Returns a map of status codes to quantities
         """
-        coroutine = self._build_for_get_inventory()
-        return get_event_loop().run_until_complete(coroutine)
+        with self.api_client.stage(BUILD, "get_inventory"):
+            kwargs = self._build_for_get_inventory()
+        return self.api_client.request_sync(**kwargs)
 
     def get_order_by_id(self, order_id: int) -> m.Order:
         """
         For valid response try integer IDs with value >= 1 and <= 10. Other values will generated exceptions
         """
-        coroutine = self._build_for_get_order_by_id(order_id=order_id)
-        return get_event_loop().run_until_complete(coroutine)
+        with self.api_client.stage(BUILD, "get_order_by_id"):
+            kwargs = self._build_for_get_order_by_id(order_id=order_id)
+        return self.api_client.request_sync(**kwargs)
 
     def place_order(self, body: m.Order) -> m.Order:
-        coroutine = self._build_for_place_order(body=body)
-        return get_event_loop().run_until_complete(coroutine)
+        with self.api_client.stage(BUILD, "place_order"):
+            kwargs = self._build_for_place_order(body=body)
+        return self.api_client.request_sync(**kwargs)
@@ -1,45 +1,352 @@
-from asyncio import get_event_loop
-from typing import Any, Awaitable, Callable, Dict, Generic, Type, TypeVar, overload
+import asyncio
+import codecs
+import importlib
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from fnmatch import fnmatchcase
+from functools import lru_cache
+from json.decoder import WHITESPACE  # type: ignore
+from string import Formatter
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Collection,
+    ContextManager,
+    Coroutine,
+    Dict,
+    Generic,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    Type,
+    TypeVar,
+    overload,
+)
+from urllib.parse import quote
 
-from httpx import AsyncClient, Request, Response
-from pydantic import ValidationError, parse_obj_as
+from httpx import URL, AsyncClient, Client, Request, Response
+from pydantic import BaseModel, ValidationError, create_model
 
-from example.client.api.pet_api import AsyncPetApi, SyncPetApi
-from example.client.api.store_api import AsyncStoreApi, SyncStoreApi
-from example.client.api.user_api import AsyncUserApi, SyncUserApi
+from example.client.batch import (
+    DEFAULT_CONCURRENCY,
+    AsyncCall,
+    BatchResult,
+    SyncCall,
+    run_batch,
+    run_batch_as_completed,
+    run_batch_sync,
+    run_batch_sync_as_completed,
+)
+from example.client.download import Destination, DownloadResult, DownloadWriter
 from example.client.exceptions import ResponseHandlingException, UnexpectedResponse
+from example.client.pool import PoolConfig, PoolStats, PoolStatsSnapshot, get_chained_trace
+from example.client.serialization import to_json
+from example.client.tracing import DECODE, ENCODE, SEND, VALIDATE, StageTracer, TracedStage
+from example.client.upload import DEFAULT_CHUNK_SIZE, MultipartEncoder, ProgressCallback
+from example.client.validation import ValidationPolicy, get_constructor
+
+if TYPE_CHECKING:
+    from example.client.cassette import Cassette
+    from example.client.api.pet_api import AsyncPetApi, SyncPetApi
+    from example.client.api.store_api import AsyncStoreApi, SyncStoreApi
+    from example.client.api.user_api import AsyncUserApi, SyncUserApi
 
 ClientT = TypeVar("ClientT", bound="ApiClient")
+T = TypeVar("T")
 
 
 class AsyncApis(Generic[ClientT]):
+    """
+    The async apis; each api is created (and its module imported) when it is first accessed
+    """
+
+    pet_api: "AsyncPetApi"
+    store_api: "AsyncStoreApi"
+    user_api: "AsyncUserApi"
+
     def __init__(self, client: ClientT):
         self.client = client
 
-        self.pet_api = AsyncPetApi(self.client)
-        self.store_api = AsyncStoreApi(self.client)
-        self.user_api = AsyncUserApi(self.client)
+    if not TYPE_CHECKING:
+
+        def __getattr__(self, name: str) -> Any:
+            api = self.__dict__[name] = _load_api_class(name, "Async")(self.client)
+            return api
+
+        def __dir__(self) -> Iterable[str]:
+            return [*super().__dir__(), *API_CLASS_NAMES]
+
+    async def batch(
+        self, calls: Iterable[AsyncCall[T]], *, concurrency: int = DEFAULT_CONCURRENCY
+    ) -> List[BatchResult[T]]:
+        """
+        Runs the calls (e.g. `functools.partial(apis.pet_api.get_pet_by_id, pet_id=1)`, or unawaited operation
+        coroutines) with at most `concurrency` in flight, returning one result per call in the order of `calls`.
+
+        Exceptions are captured per call in `BatchResult.error` instead of aborting the batch.
+        """
+        return await run_batch(calls, concurrency)
+
+    def batch_as_completed(
+        self, calls: Iterable[AsyncCall[T]], *, concurrency: int = DEFAULT_CONCURRENCY
+    ) -> AsyncIterator[BatchResult[T]]:
+        """
+        Like `batch`, but yields the results as the calls complete; `BatchResult.index` is the call's position
+        """
+        return run_batch_as_completed(calls, concurrency)
 
 
 class SyncApis(Generic[ClientT]):
+    """
+    The sync apis; each api is created (and its module imported) when it is first accessed
+    """
+
+    pet_api: "SyncPetApi"
+    store_api: "SyncStoreApi"
+    user_api: "SyncUserApi"
+
     def __init__(self, client: ClientT):
         self.client = client
 
-        self.pet_api = SyncPetApi(self.client)
-        self.store_api = SyncStoreApi(self.client)
-        self.user_api = SyncUserApi(self.client)
+    if not TYPE_CHECKING:
+
+        def __getattr__(self, name: str) -> Any:
+            api = self.__dict__[name] = _load_api_class(name, "Sync")(self.client)
+            return api
+
+        def __dir__(self) -> Iterable[str]:
+            return [*super().__dir__(), *API_CLASS_NAMES]
+
+    def batch(self, calls: Iterable[SyncCall[T]], *, concurrency: int = DEFAULT_CONCURRENCY) -> List[BatchResult[T]]:
+        """
+        Runs the calls (e.g. `functools.partial(apis.pet_api.get_pet_by_id, pet_id=1)`) on up to `concurrency`
+        threads, returning one result per call in the order of `calls`.
+
+        Exceptions are captured per call in `BatchResult.error` instead of aborting the batch.
+        """
+        return run_batch_sync(calls, concurrency)
+
+    def batch_as_completed(
+        self, calls: Iterable[SyncCall[T]], *, concurrency: int = DEFAULT_CONCURRENCY
+    ) -> Iterator[BatchResult[T]]:
+        """
+        Like `batch`, but yields the results as the calls complete; `BatchResult.index` is the call's position
+        """
+        return run_batch_sync_as_completed(calls, concurrency)
 
 
-T = TypeVar("T")
 Send = Callable[[Request], Awaitable[Response]]
+SendSync = Callable[[Request], Response]
 MiddlewareT = Callable[[Request, Send], Awaitable[Response]]
+SyncMiddlewareT = Callable[[Request, SendSync], Response]
+Parser = Callable[[Any], Any]
+UploadProgress = Callable[[Optional[str], int, Optional[int]], None]  # operation id, bytes sent, total bytes
+
+OPERATION_ID = "operation_id"
+PARSED_RESULTS = "parsed_results"
+URL_TEMPLATE = "url_template"
+NO_BODY: Any = object()
+_NO_STAGE = nullcontext()
+
+OPERATIONS_BY_API: Dict[str, Tuple[str, ...]] = {
+    "pet_api": (
+        "add_pet",
+        "delete_pet",
+        "find_pets_by_status",
+        "find_pets_by_tags",
+        "get_pet_by_id",
+        "update_pet",
+        "update_pet_with_form",
+        "upload_file",
+    ),
+    "store_api": ("delete_order", "get_inventory", "get_order_by_id", "place_order"),
+    "user_api": (
+        "create_user",
+        "create_users_with_array_input",
+        "create_users_with_list_input",
+        "delete_user",
+        "get_user_by_name",
+        "login_user",
+        "logout_user",
+        "update_user",
+    ),
+}
+
+API_CLASS_NAMES: Dict[str, str] = {
+    "pet_api": "PetApi",
+    "store_api": "StoreApi",
+    "user_api": "UserApi",
+}
+
+
+def _load_api_class(name: str, prefix: str) -> Any:
+    """
+    Imports the module of the api `name` (e.g. "pet_api"), and returns its class with `prefix` ("Async" or "Sync")
+    """
+    try:
+        class_name = API_CLASS_NAMES[name]
+    except KeyError:
+        raise AttributeError(name) from None
+    return getattr(importlib.import_module(f"example.client.api.{name}"), prefix + class_name)
+
+
+def get_operation_id(request: Request) -> Optional[str]:
+    """
+    Returns the id of the operation the request was built for (None for requests not built by the generated apis)
+    """
+    return request.extensions.get(OPERATION_ID)
+
+
+def get_url_template(request: Request) -> str:
+    """
+    Returns the path of the request before path parameters were filled in (e.g. "/pet/{petId}"), or the request's
+    path for requests not built by the generated apis
+    """
+    return request.extensions.get(URL_TEMPLATE, request.url.path)
+
+
+class Route:
+    """
+    An operation's URL template (e.g. "/user/{username}"), split into literal parts and path parameters once
+    """
+
+    __slots__ = ("template", "parts", "static_path")
+
+    def __init__(self, template: str) -> None:
+        self.template = template
+        self.parts = [(quote(literal, safe=_PATH_SAFE), name) for literal, name, _, _ in Formatter().parse(template)]
+        self.static_path = None if any(name is not None for _, name in self.parts) else template
+
+    def path(self, path_params: Dict[str, Any]) -> str:
+        """
+        Returns the path with the path parameters filled in, percent-encoded so a value containing "/", "?" or "#"
+        stays within its path segment
+        """
+        if self.static_path is not None:
+            return self.static_path
+        path = []
+        for literal, name in self.parts:
+            path.append(literal)
+            if name is not None:
+                path.append(quote_path_param(str(path_params[name])))
+        return "".join(path)
+
+
+_PATH_SAFE = "/%:@!$&'()*+,;=~"  # kept as is in a template's literal parts; anything else (e.g. non-ASCII) is encoded
+_routes: Dict[str, Route] = {}
+
+
+def get_route(template: str) -> Route:
+    try:
+        return _routes[template]
+    except KeyError:
+        route = _routes[template] = Route(template)
+        return route
+
+
+@lru_cache(maxsize=1024)
+def quote_path_param(value: str) -> str:
+    return quote(value, safe="")
 
 
 class ApiClient:
-    def __init__(self, host: str = None, **kwargs: Any) -> None:
-        self.host = host
-        self.middleware: MiddlewareT = BaseMiddleware()
-        self._async_client = AsyncClient(**kwargs)
+    def __init__(
+        self,
+        host: str = None,
+        pool: PoolConfig = None,
+        validation: ValidationPolicy = None,
+        *,
+        async_kwargs: Dict[str, Any] = None,
+        sync_kwargs: Dict[str, Any] = None,
+        **kwargs: Any,
+    ) -> None:
+        """
+        `pool` configures the connection pools (limits, keep-alive, HTTP/2 and timeouts); other keyword arguments
+        are passed to `httpx.AsyncClient` and `httpx.Client` and take precedence. Arguments for only one of them
+        (e.g. a transport or event hooks, which differ between the two) are passed in `async_kwargs` and
+        `sync_kwargs`.
+
+        `validation` sets how responses are validated (see `validation.ValidationPolicy`); policies for specific
+        operations can be set in `operation_validation`, by operation id.
+        """
+        self.host = host  # parsed once, for get_url to put the paths on
+        self._middleware: List[Tuple[MiddlewareT, Optional[Tuple[str, ...]]]] = []
+        self._sync_middleware: List[Tuple[SyncMiddlewareT, Optional[Tuple[str, ...]]]] = []
+        self._chains: Dict[Tuple[Optional[str], Send], Send] = {}
+        self._sync_chains: Dict[Tuple[Optional[str], SendSync], SendSync] = {}
+        self.pool = pool if pool is not None else PoolConfig()
+        if pool is not None:
+            kwargs = {**pool.client_kwargs(), **kwargs}
+        self._async_client = AsyncClient(**{**kwargs, **(async_kwargs or {})})
+        self._sync_client = Client(**{**kwargs, **(sync_kwargs or {})})
+        self._async_pool_stats = PoolStats()
+        self._sync_pool_stats = PoolStats()
+        self.tracer: Optional[StageTracer] = None
+        self.upload_chunk_size = DEFAULT_CHUNK_SIZE
+        self.upload_progress: Optional[UploadProgress] = None
+        self.download_chunk_size = DEFAULT_CHUNK_SIZE
+        self.cassette: Optional["Cassette"] = None
+        self.validation = validation if validation is not None else ValidationPolicy()
+        self.operation_validation: Dict[str, ValidationPolicy] = {}
+        self._middleware_loop = _BackgroundLoop()
+
+    @property
+    def host(self) -> Optional[str]:
+        return self._host
+
+    @host.setter
+    def host(self, host: Optional[str]) -> None:
+        self._host = host
+        self._base_url = URL(host or "")
+        self._base_path = self._base_url.raw_path.split(b"?", 1)[0].rstrip(b"/") if host else b""
+        self._static_urls: Dict[str, URL] = {}
+
+    async def aclose(self) -> None:
+        """
+        Closes the async client's connections
+        """
+        await self._async_client.aclose()
+
+    def close(self) -> None:
+        """
+        Closes the sync client's connections (and the event loop running async-only middleware for sync calls)
+        """
+        self._sync_client.close()
+        self._middleware_loop.close()
+
+    def get_pool_stats(self, *, sync: bool = False) -> PoolStatsSnapshot:
+        """
+        Returns the current connections of the async (or sync) pool, and pool wait times and new connections
+        collected since the client was created (only if `PoolConfig.collect_stats` is set)
+        """
+        if sync:
+            return self._sync_pool_stats.snapshot(self._sync_client)
+        return self._async_pool_stats.snapshot(self._async_client)
+
+    def stage(self, stage: str, operation_id: Optional[str]) -> ContextManager[None]:
+        """
+        Returns a context manager reporting `stage` to `tracer` (a no-op if no tracer is set)
+        """
+        tracer = self.tracer
+        if tracer is None:
+            return _NO_STAGE
+        return TracedStage(tracer, stage, operation_id)
+
+    def get_parser(self, type_: Any, operation_id: Optional[str]) -> Parser:
+        """
+        Returns the parser for a response of the operation, validating or not as its validation policy decides
+        """
+        policy = self.operation_validation.get(operation_id, self.validation) if operation_id else self.validation
+        if policy.should_validate():
+            return get_parser(type_)
+        return get_constructor(type_)
 
     @overload
     async def request(
@@ -56,54 +363,600 @@ class ApiClient:
     async def request(  # noqa F811
         self, *, type_: Any, method: str, url: str, path_params: Dict[str, Any] = None, **kwargs: Any
     ) -> Any:
-        if path_params is None:
-            path_params = {}
-        url = (self.host or "") + url.format(**path_params)
-        request = Request(method, url, **kwargs)
+        request = self.build_request(method=method, url=url, path_params=path_params, **kwargs)
         return await self.send(request, type_)
 
     @overload
-    def request_sync(self, *, type_: Type[T], **kwargs: Any) -> T:
+    def request_sync(
+        self, *, type_: Type[T], method: str, url: str, path_params: Dict[str, Any] = None, **kwargs: Any
+    ) -> T:
         ...
 
     @overload  # noqa F811
-    def request_sync(self, *, type_: None, **kwargs: Any) -> None:
+    def request_sync(
+        self, *, type_: None, method: str, url: str, path_params: Dict[str, Any] = None, **kwargs: Any
+    ) -> None:
         ...
 
-    def request_sync(self, *, type_: Any, **kwargs: Any) -> Any:  # noqa F811
+    def request_sync(  # noqa F811
+        self, *, type_: Any, method: str, url: str, path_params: Dict[str, Any] = None, **kwargs: Any
+    ) -> Any:
+        """
+        Sends the request through the synchronous transport; no event loop is involved
+        """
+        request = self.build_request(method=method, url=url, path_params=path_params, **kwargs)
+        return self.send_sync(request, type_)
+
+    async def stream(
+        self, *, type_: Any, method: str, url: str, path_params: Dict[str, Any] = None, **kwargs: Any
+    ) -> AsyncIterator[Any]:
+        """
+        For responses that are JSON arrays: yields the parsed items one at a time while the body is being received.
+
+        `type_` is the type of the whole response (e.g. `List[m.Pet]`); each item is parsed as its item type.
+        """
+        request = self.build_request(method=method, url=url, path_params=path_params, **kwargs)
+        operation_id = get_operation_id(request)
+        parse = self.get_parser(_get_item_type(type_), operation_id)
+        with self.stage(SEND, operation_id):
+            response = await self.get_chain(request, self.send_inner_stream)(request)
+        try:
+            if response.status_code not in [200, 201]:
+                await response.aread()
+                raise UnexpectedResponse.for_response(response)
+            decoder = JsonArrayDecoder()
+            async for chunk in response.aiter_bytes():
+                for item in _decode_items(decoder, chunk):
+                    yield _parse_item(parse, item)
+            for item in _decode_items(decoder, b"", final=True):
+                yield _parse_item(parse, item)
+        finally:
+            await response.aclose()
+
+    def stream_sync(
+        self, *, type_: Any, method: str, url: str, path_params: Dict[str, Any] = None, **kwargs: Any
+    ) -> Iterator[Any]:
+        """
+        The synchronous equivalent of `stream`
+        """
+        request = self.build_request(method=method, url=url, path_params=path_params, **kwargs)
+        operation_id = get_operation_id(request)
+        parse = self.get_parser(_get_item_type(type_), operation_id)
+        with self.stage(SEND, operation_id):
+            response = self.get_chain_sync(request, self.send_inner_stream_sync)(request)
+        try:
+            if response.status_code not in [200, 201]:
+                response.read()
+                raise UnexpectedResponse.for_response(response)
+            decoder = JsonArrayDecoder()
+            for chunk in response.iter_bytes():
+                for item in _decode_items(decoder, chunk):
+                    yield _parse_item(parse, item)
+            for item in _decode_items(decoder, b"", final=True):
+                yield _parse_item(parse, item)
+        finally:
+            response.close()
+
+    async def download(
+        self,
+        destination: Destination,
+        *,
+        checksum: str = None,
+        type_: Any = None,
+        method: str,
+        url: str,
+        path_params: Dict[str, Any] = None,
+        **kwargs: Any,
+    ) -> DownloadResult:
+        """
+        For responses that are files: writes the body to `destination` (a path, a file or a writable buffer) in
+        `download_chunk_size` chunks while it is being received, computing its `checksum` (the name of a hashlib
+        algorithm) on the way; see `download.DownloadWriter`.
+
+        Files are written on a worker thread, so writes don't block the event loop.
+        """
+        request = self.build_request(method=method, url=url, path_params=path_params, **kwargs)
+        with self.stage(SEND, get_operation_id(request)):
+            response = await self.get_chain(request, self.send_inner_stream)(request)
+        try:
+            if response.status_code not in [200, 201]:
+                await response.aread()
+                raise UnexpectedResponse.for_response(response)
+            writer = DownloadWriter(destination, checksum)
+            loop = asyncio.get_running_loop()
+            try:
+                async for chunk in response.aiter_bytes(self.download_chunk_size):
+                    if writer.blocking:
+                        await loop.run_in_executor(None, writer.write, chunk)
+                    else:
+                        writer.write(chunk)
+            except BaseException as e:
+                writer.close(e)
+                raise
+            writer.close()
+        finally:
+            await response.aclose()
+        return writer.result(response.headers.get("content-type"))
+
+    def download_sync(
+        self,
+        destination: Destination,
+        *,
+        checksum: str = None,
+        type_: Any = None,
+        method: str,
+        url: str,
+        path_params: Dict[str, Any] = None,
+        **kwargs: Any,
+    ) -> DownloadResult:
+        """
+        The synchronous equivalent of `download`
+        """
+        request = self.build_request(method=method, url=url, path_params=path_params, **kwargs)
+        with self.stage(SEND, get_operation_id(request)):
+            response = self.get_chain_sync(request, self.send_inner_stream_sync)(request)
+        try:
+            if response.status_code not in [200, 201]:
+                response.read()
+                raise UnexpectedResponse.for_response(response)
+            writer = DownloadWriter(destination, checksum)
+            try:
+                for chunk in response.iter_bytes(self.download_chunk_size):
+                    writer.write(chunk)
+            except BaseException as e:
+                writer.close(e)
+                raise
+            writer.close()
+        finally:
+            response.close()
+        return writer.result(response.headers.get("content-type"))
+
+    def build_request(
+        self,
+        *,
+        method: str,
+        url: str,
+        path_params: Dict[str, Any] = None,
+        operation_id: str = None,
+        json_body: Any = NO_BODY,
+        **kwargs: Any,
+    ) -> Request:
         """
-        This method is not used by the generated apis, but is included for convenience
+        Builds the request for an operation; `json_body` (if given) is serialized as the request's content, and
+        `files` (if any) are streamed as a multipart body in `upload_chunk_size` chunks, reporting progress to
+        `upload_progress`
         """
-        return get_event_loop().run_until_complete(self.request(type_=type_, **kwargs))
+        with self.stage(ENCODE, operation_id):
+            if json_body is not NO_BODY:
+                kwargs["content"] = to_json(json_body)
+            multipart = None
+            if kwargs.get("files"):
+                multipart = MultipartEncoder(
+                    kwargs.pop("data", None),
+                    kwargs.pop("files"),
+                    chunk_size=self.upload_chunk_size,
+                    progress=self._get_upload_progress(operation_id),
+                )
+                kwargs["headers"] = {**(kwargs.get("headers") or {}), **multipart.get_headers()}
+            request = Request(method, self.get_url(url, path_params), **kwargs)
+            if multipart is not None:
+                request.stream = multipart  # set afterwards, so httpx still adds the Host header
+            request.extensions[URL_TEMPLATE] = url
+            if operation_id is not None:
+                request.extensions[OPERATION_ID] = operation_id
+        return request
+
+    def _get_upload_progress(self, operation_id: Optional[str]) -> Optional[ProgressCallback]:
+        upload_progress = self.upload_progress
+        if upload_progress is None:
+            return None
+        return lambda sent, total: upload_progress(operation_id, sent, total)
+
+    def get_url(self, url: str, path_params: Optional[Dict[str, Any]] = None) -> URL:
+        """
+        Returns the URL for the URL template `url` on `host`, appending the path to the host parsed in advance; URLs
+        without path parameters are only built once
+        """
+        static_url = self._static_urls.get(url)
+        if static_url is not None:
+            return static_url
+        route = get_route(url)
+        raw_path = self._base_path + route.path(path_params or {}).encode("ascii")
+        result = self._base_url.copy_with(raw_path=raw_path)
+        if route.static_path is not None:
+            self._static_urls[url] = result
+        return result
 
     async def send(self, request: Request, type_: Type[T]) -> T:
-        response = await self.middleware(request, self.send_inner)
+        operation_id = get_operation_id(request)
+        with self.stage(SEND, operation_id):
+            response = await self.get_chain(request, self.send_inner)(request)
+        return self.handle_response(response, type_, operation_id)
+
+    def send_sync(self, request: Request, type_: Type[T]) -> T:
+        operation_id = get_operation_id(request)
+        with self.stage(SEND, operation_id):
+            response = self.get_chain_sync(request, self.send_inner_sync)(request)
+        return self.handle_response(response, type_, operation_id)
+
+    def handle_response(self, response: Response, type_: Type[T], operation_id: str = None) -> T:
+        """
+        Parses the response as `type_` (the body is returned as is for `bytes`, which is the type of file responses).
+
+        Middleware that hands out the same response more than once (like the cache middleware) can set
+        `response.extensions[PARSED_RESULTS]` to a dict; the parsed result is then stored there and reused.
+        """
         if response.status_code in [200, 201]:
+            if type_ is None:
+                return None  # type: ignore
+            if type_ is bytes:
+                return response.content  # type: ignore
+            parsed_results = response.extensions.get(PARSED_RESULTS)
+            if parsed_results is not None and type_ in parsed_results:
+                return parsed_results[type_]
+            with self.stage(DECODE, operation_id):
+                data = response.json()
             try:
-                return parse_obj_as(type_, response.json())
+                with self.stage(VALIDATE, operation_id):
+                    result = self.get_parser(type_, operation_id)(data)
             except ValidationError as e:
                 raise ResponseHandlingException(e)
+            if parsed_results is not None:
+                parsed_results[type_] = result
+            return result
         raise UnexpectedResponse.for_response(response)
 
     async def send_inner(self, request: Request) -> Response:
+        """
+        Sends the request (or, with a `cassette`, replays or records its response)
+        """
+        cassette = self.cassette
+        if cassette is not None and cassette.replaying:
+            return await cassette.replay(request)
+        if self.pool.collect_stats:
+            request.extensions["trace"] = self._async_pool_stats.trace_async(get_chained_trace(request))
         try:
             response = await self._async_client.send(request)
         except Exception as e:
             raise ResponseHandlingException(e)
+        if cassette is not None:
+            cassette.record(request, response)
+        return response
+
+    def send_inner_sync(self, request: Request) -> Response:
+        cassette = self.cassette
+        if cassette is not None and cassette.replaying:
+            return cassette.replay_sync(request)
+        if self.pool.collect_stats:
+            request.extensions["trace"] = self._sync_pool_stats.trace(get_chained_trace(request))
+        try:
+            response = self._sync_client.send(request)
+        except Exception as e:
+            raise ResponseHandlingException(e)
+        if cassette is not None:
+            cassette.record(request, response)
+        return response
+
+    async def send_inner_stream(self, request: Request) -> Response:
+        """
+        Like `send_inner`, but the response body is left unread (except when recording it)
+        """
+        cassette = self.cassette
+        if cassette is not None and cassette.replaying:
+            return await cassette.replay(request)
+        if self.pool.collect_stats:
+            request.extensions["trace"] = self._async_pool_stats.trace_async(get_chained_trace(request))
+        try:
+            response = await self._async_client.send(request, stream=True)
+            if cassette is not None:
+                await response.aread()
+        except Exception as e:
+            raise ResponseHandlingException(e)
+        if cassette is not None:
+            cassette.record(request, response)
+        return response
+
+    def send_inner_stream_sync(self, request: Request) -> Response:
+        cassette = self.cassette
+        if cassette is not None and cassette.replaying:
+            return cassette.replay_sync(request)
+        if self.pool.collect_stats:
+            request.extensions["trace"] = self._sync_pool_stats.trace(get_chained_trace(request))
+        try:
+            response = self._sync_client.send(request, stream=True)
+            if cassette is not None:
+                response.read()
+        except Exception as e:
+            raise ResponseHandlingException(e)
+        if cassette is not None:
+            cassette.record(request, response)
         return response
 
-    def add_middleware(self, middleware: MiddlewareT) -> None:
-        current_middleware = self.middleware
+    def add_middleware(
+        self, middleware: MiddlewareT, *, operations: Collection[str] = None, apis: Collection[str] = None
+    ) -> None:
+        """
+        Adds middleware to the async chain; middleware added last runs first.
+
+        The middleware applies to every request, unless it is limited to `operations` (operation ids, which may
+        contain shell-style wildcards like "get_*") and/or `apis` (e.g. "user_api").
+
+        If the middleware also provides a `call_sync` method (like `BaseMiddleware` does), that method
+        is added to the sync chain as well, so both transports behave the same. Middleware without one runs
+        on the sync chain too, on an event loop the client keeps on a thread of its own (until `close`); each
+        sync call then waits for that thread, so middleware used by the sync apis should provide `call_sync`.
+
+        Middleware with a `bind_client` method (like `auth.AuthMiddleware`) is passed the client first.
+        """
+        bind_client = getattr(middleware, "bind_client", None)
+        if bind_client is not None:
+            bind_client(self)
+        self._middleware.append((middleware, _get_scope(operations, apis)))
+        self._chains.clear()
+
+        call_sync = getattr(middleware, "call_sync", None)
+        if call_sync is None:
+            call_sync = _run_async_middleware(middleware, self._middleware_loop)
+        self.add_sync_middleware(call_sync, operations=operations, apis=apis)
+
+    def add_sync_middleware(
+        self, middleware: SyncMiddlewareT, *, operations: Collection[str] = None, apis: Collection[str] = None
+    ) -> None:
+        self._sync_middleware.append((middleware, _get_scope(operations, apis)))
+        self._sync_chains.clear()
+
+    def get_chain(self, request: Request, send: Send) -> Send:
+        """
+        Returns `send` wrapped in the middleware that applies to the request's operation.
+
+        Chains are compiled once per operation, and compiled again only after middleware is added.
+        """
+        operation_id = get_operation_id(request)
+        key = (operation_id, send)
+        chain = self._chains.get(key)
+        if chain is None:
+            chain = self._chains[key] = _compile_chain(_select(self._middleware, operation_id), send)
+        return chain
+
+    def get_chain_sync(self, request: Request, send: SendSync) -> SendSync:
+        operation_id = get_operation_id(request)
+        key = (operation_id, send)
+        chain = self._sync_chains.get(key)
+        if chain is None:
+            chain = self._sync_chains[key] = _compile_chain_sync(_select(self._sync_middleware, operation_id), send)
+        return chain
+
+
+M = TypeVar("M")
+
+
+def _get_scope(operations: Optional[Collection[str]], apis: Optional[Collection[str]]) -> Optional[Tuple[str, ...]]:
+    """
+    Returns the operation id patterns middleware is limited to, or None if it applies to every request
+    """
+    if operations is None and apis is None:
+        return None
+    patterns = list(operations or ())
+    for api in apis or ():
+        if api not in OPERATIONS_BY_API:
+            raise ValueError(f"Unknown api {api!r}, expected one of {sorted(OPERATIONS_BY_API)}")
+        patterns.extend(OPERATIONS_BY_API[api])
+    return tuple(patterns)
+
+
+def _select(middleware: List[Tuple[M, Optional[Tuple[str, ...]]]], operation_id: Optional[str]) -> List[M]:
+    return [
+        item
+        for item, scope in middleware
+        if scope is None or (operation_id is not None and any(fnmatchcase(operation_id, p) for p in scope))
+    ]
+
+
+def _compile_chain(middleware: List[MiddlewareT], send: Send) -> Send:
+    """
+    Binds each middleware to the next one once, so a request only goes through one call per middleware
+    """
+    for item in middleware:
+        send = _bind(item, send)
+    return send
 
-        async def new_middleware(request: Request, call_next: Send) -> Response:
-            async def inner_send(request: Request) -> Response:
-                return await current_middleware(request, call_next)
 
-            return await middleware(request, inner_send)
+def _bind(middleware: MiddlewareT, call_next: Send) -> Send:
+    def send(request: Request) -> Awaitable[Response]:
+        return middleware(request, call_next)
 
-        self.middleware = new_middleware
+    return send
+
+
+def _run_async_middleware(middleware: MiddlewareT, loop: "_BackgroundLoop") -> SyncMiddlewareT:
+    """
+    Adapts async-only middleware to the sync chain, running it on `loop`; its `call_next` calls the rest of the sync
+    chain on the loop's executor, so concurrent sync calls don't wait for each other's requests
+    """
+
+    def call_sync(request: Request, call_next: SendSync) -> Response:
+        async def send(request: Request) -> Response:
+            return await asyncio.get_running_loop().run_in_executor(None, call_next, request)
+
+        async def run() -> Response:
+            return await middleware(request, send)
+
+        return loop.run(run())
+
+    return call_sync
+
+
+class _BackgroundLoop:
+    """
+    An event loop running on a thread of its own (with its own executor), started when first used
+    """
+
+    def __init__(self) -> None:
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def run(self, coroutine: Coroutine[Any, Any, T]) -> T:
+        """
+        Runs the coroutine on the loop, blocking until it's done
+        """
+        return asyncio.run_coroutine_threadsafe(coroutine, self._get_loop()).result()
+
+    def close(self) -> None:
+        with self._lock:
+            loop, thread, executor = self._loop, self._thread, self._executor
+            self._loop = self._thread = self._executor = None
+        if loop is not None and thread is not None and executor is not None:
+            loop.call_soon_threadsafe(loop.stop)
+            thread.join()
+            executor.shutdown(wait=True)
+            loop.close()
+
+    def _get_loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                self._executor = ThreadPoolExecutor(thread_name_prefix="api-middleware-send")
+                self._loop.set_default_executor(self._executor)
+                self._thread = threading.Thread(target=self._loop.run_forever, name="api-middleware", daemon=True)
+                self._thread.start()
+            return self._loop
+
+
+def _compile_chain_sync(middleware: List[SyncMiddlewareT], send: SendSync) -> SendSync:
+    for item in middleware:
+        send = _bind_sync(item, send)
+    return send
+
+
+def _bind_sync(middleware: SyncMiddlewareT, call_next: SendSync) -> SendSync:
+    def send(request: Request) -> Response:
+        return middleware(request, call_next)
+
+    return send
+
+
+_parsers: Dict[Any, Parser] = {}
+
+
+def get_parser(type_: Any) -> Parser:
+    """
+    Returns the parser for (decoded) responses of type `type_`.
+
+    Parsers are built on first use and reused for every later response of the same type.
+    """
+    try:
+        return _parsers[type_]
+    except KeyError:
+        parser = _parsers[type_] = _build_parser(type_)
+        return parser
+
+
+def _build_parser(type_: Any) -> Parser:
+    if type_ is None:
+        return _parse_none
+    if type_ is Any:
+        return _parse_any
+    if isinstance(type_, type) and issubclass(type_, BaseModel):
+        return type_.parse_obj
+
+    parsing_model = create_model(f"ParsingModel[{type_}]", __root__=(type_, ...))
+
+    def parse(data: Any) -> Any:
+        return parsing_model(__root__=data).__root__  # type: ignore
+
+    if type_ is str:
+        return lambda data: data if isinstance(data, str) else parse(data)
+    return parse
+
+
+def _parse_none(data: Any) -> None:
+    return None
+
+
+def _parse_any(data: Any) -> Any:
+    return data
+
+
+def _get_item_type(type_: Any) -> Any:
+    args = getattr(type_, "__args__", None)
+    return args[0] if args else Any
+
+
+def _decode_items(decoder: "JsonArrayDecoder", chunk: bytes, final: bool = False) -> List[Any]:
+    try:
+        return decoder.feed(chunk, final=final)
+    except ValueError as e:
+        raise ResponseHandlingException(e)
+
+
+def _parse_item(parse: Parser, item: Any) -> Any:
+    try:
+        return parse(item)
+    except ValidationError as e:
+        raise ResponseHandlingException(e)
+
+
+class JsonArrayDecoder:
+    """
+    Incrementally decodes the items of a top-level JSON array from chunks of bytes
+    """
+
+    def __init__(self) -> None:
+        self._text_decoder = codecs.getincrementaldecoder("utf-8")()
+        self._json_decoder = json.JSONDecoder()
+        self._buffer = ""
+        self._started = False
+        self._finished = False
+
+    def feed(self, chunk: bytes, final: bool = False) -> List[Any]:
+        """
+        Returns the items completed by `chunk`; pass `final=True` once the body has been fully received
+        """
+        buffer = self._buffer + self._text_decoder.decode(chunk, final=final)
+        items: List[Any] = []
+        pos = WHITESPACE.match(buffer, 0).end()
+        if not self._started and pos < len(buffer):
+            if buffer[pos] != "[":
+                raise ValueError("Expected a JSON array")
+            self._started = True
+            pos += 1
+        while self._started and not self._finished:
+            pos = WHITESPACE.match(buffer, pos).end()
+            if pos == len(buffer):
+                break
+            if buffer[pos] == "]":
+                self._finished = True
+                pos += 1
+                break
+            if buffer[pos] == ",":
+                pos += 1
+                continue
+            try:
+                item, end = self._json_decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                if final:
+                    raise
+                break
+            if end == len(buffer) and not final:
+                break  # a number at the end of the buffer may continue in the next chunk
+            items.append(item)
+            pos = end
+        self._buffer = buffer[pos:]
+        if final and not self._finished:
+            raise ValueError("Incomplete JSON array")
+        return items
 
 
 class BaseMiddleware:
     async def __call__(self, request: Request, call_next: Send) -> Response:
         return await call_next(request)
+
+    def call_sync(self, request: Request, call_next: SendSync) -> Response:
+        return call_next(request)
+
+
+class BaseSyncMiddleware:
+    def __call__(self, request: Request, call_next: SendSync) -> Response:
+        return call_next(request)
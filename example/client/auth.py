@@ -1,12 +1,15 @@
+import asyncio
+import threading
 from contextlib import suppress
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Callable, Optional
+from weakref import WeakKeyDictionary
 
 from fastapi.openapi.models import OAuthFlowPassword
-from httpx import Request, Response
+from httpx import HTTPError, Request, Response
 from pydantic import BaseModel
 
-from example.client.api_client import Send
+from example.client.api_client import ApiClient, Send, SendSync
 from example.client.exceptions import UnexpectedResponse
 from example.client.password_flow_client import (
     AccessTokenRequest,
@@ -14,6 +17,9 @@ from example.client.password_flow_client import (
     RefreshTokenRequest,
     TokenSuccessResponse,
 )
+from example.client.pool import PoolConfig
+from example.client.retry import is_replayable
+from example.client.token_store import StoredTokens, TokenStore, get_token_key
 
 HTTP_401_UNAUTHORIZED = 401
 
@@ -25,6 +31,7 @@ class AuthState(BaseModel):
     refresh_token: Optional[str]
     expires_at: Optional[datetime]  # should be UTC
     scope: Optional[str]
+    issued_at: Optional[datetime]  # UTC
 
     def get_login_request(self) -> Optional[AccessTokenRequest]:
         if self.username is None or self.password is None:
@@ -42,17 +49,96 @@ class AuthState(BaseModel):
         return self.expires_at < datetime.utcnow() + timedelta(seconds=30)
 
     def update(self, token_success_response: TokenSuccessResponse) -> None:
+        self.issued_at = datetime.utcnow()
         self.access_token = token_success_response.access_token
         self.refresh_token = token_success_response.refresh_token
-        self.scope = token_success_response.scope
+        if token_success_response.scope is not None:  # otherwise the requested scope was granted
+            self.scope = token_success_response.scope
         if token_success_response.expires_in is not None:
             self.expires_at = datetime.utcnow() + timedelta(seconds=token_success_response.expires_in)
 
+    def get_stored_tokens(self) -> Optional[StoredTokens]:
+        if self.access_token is None:
+            return None
+        return StoredTokens(
+            access_token=self.access_token,
+            refresh_token=self.refresh_token,
+            expires_at=self.expires_at,
+            scope=self.scope,
+            issued_at=self.issued_at,
+        )
+
+    def load_stored_tokens(self, tokens: StoredTokens) -> None:
+        self.access_token = tokens.access_token
+        self.refresh_token = tokens.refresh_token
+        self.expires_at = tokens.expires_at
+        self.scope = tokens.scope
+        self.issued_at = tokens.issued_at
+
+    def is_older_than(self, tokens: StoredTokens) -> bool:
+        """
+        Returns whether `tokens` were obtained after the current ones (compared by when they were issued, or else by
+        when they expire); tokens that can't be compared are taken to be newer if they differ
+        """
+        if self.access_token is None:
+            return True
+        if tokens.access_token == self.access_token:
+            return False
+        for current, stored in ((self.issued_at, tokens.issued_at), (self.expires_at, tokens.expires_at)):
+            if current is not None and stored is not None:
+                return stored > current
+        return True
+
 
 class AuthMiddleware:
-    def __init__(self, auth_state: AuthState, flow: OAuthFlowPassword) -> None:
+    """
+    Adds the access token to requests, refreshes it when it has expired, and refreshes it (or logs in again) when a
+    request is rejected with `401 Unauthorized`, then sends the request again. Request bodies that can't be sent
+    again (streamed from e.g. a pipe) aren't buffered for that: their `401` is returned after the token is renewed.
+
+    Concurrent requests share token requests: while one request refreshes or logs in, the others wait for it and use
+    the new token. `start_refresh_task` (or `start_refresh_thread`) refreshes the token ahead of its expiry, so
+    requests don't wait for it at all.
+
+    Token requests share the connection pool and settings of the `ApiClient` the middleware is added to (or of
+    `client`), without passing through its middleware; with `pool`, they are sent with clients of their own. With
+    `token_store`, tokens are saved when they change and taken over from the store when another client (or process)
+    with the same credentials (username, token URL and scope) has saved newer ones.
+    """
+
+    def __init__(
+        self,
+        auth_state: AuthState,
+        flow: OAuthFlowPassword,
+        pool: PoolConfig = None,
+        *,
+        client: ApiClient = None,
+        token_store: TokenStore = None,
+    ) -> None:
         self.auth_state = auth_state
-        self.flow_client = PasswordFlowClient(flow)
+        self.flow = flow
+        if client is not None:
+            self.flow_client = PasswordFlowClient(
+                flow, async_client=client._async_client, sync_client=client._sync_client
+            )
+        else:
+            self.flow_client = PasswordFlowClient(flow, pool)
+        self._adopt_client = client is None and pool is None  # see bind_client
+        self.token_store = token_store
+        self._locks: "WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Lock]" = WeakKeyDictionary()
+        self._sync_lock = threading.Lock()
+        self.load_stored_tokens()
+
+    def bind_client(self, client: ApiClient) -> None:
+        """
+        Called by `ApiClient.add_middleware`; token requests then share the client's connection pool, unless `client`
+        or `pool` was given
+        """
+        if self._adopt_client:
+            self.flow_client = PasswordFlowClient(
+                self.flow, async_client=client._async_client, sync_client=client._sync_client
+            )
+            self._adopt_client = False
 
     @staticmethod
     def set_access_header(token: str, request: Request, *, replace: bool) -> None:
@@ -71,6 +157,7 @@ class AuthMiddleware:
             token_response = await self.flow_client.request_access_token(access_token_request)
             if isinstance(token_response, TokenSuccessResponse):
                 self.update_auth_state(token_response)
+                await self._run_store_io(self.save_stored_tokens)
                 return token_response
         return None
 
@@ -82,12 +169,119 @@ class AuthMiddleware:
             token_response = await self.flow_client.request_refresh_token(refresh_token_request)
             if isinstance(token_response, TokenSuccessResponse):
                 self.update_auth_state(token_response)
+                await self._run_store_io(self.save_stored_tokens)
                 return token_response
         return None
 
+    def login_sync(self) -> Optional[TokenSuccessResponse]:
+        access_token_request = self.auth_state.get_login_request()
+        if access_token_request is None:
+            return None
+        with suppress(UnexpectedResponse):
+            token_response = self.flow_client.request_access_token_sync(access_token_request)
+            if isinstance(token_response, TokenSuccessResponse):
+                self.update_auth_state(token_response)
+                self.save_stored_tokens()
+                return token_response
+        return None
+
+    def refresh_sync(self) -> Optional[TokenSuccessResponse]:
+        refresh_token_request = self.auth_state.get_refresh_request()
+        if refresh_token_request is None:
+            return None
+        with suppress(UnexpectedResponse):
+            token_response = self.flow_client.request_refresh_token_sync(refresh_token_request)
+            if isinstance(token_response, TokenSuccessResponse):
+                self.update_auth_state(token_response)
+                self.save_stored_tokens()
+                return token_response
+        return None
+
+    def _get_lock(self) -> asyncio.Lock:
+        loop = asyncio.get_running_loop()
+        lock = self._locks.get(loop)
+        if lock is None:
+            lock = self._locks[loop] = asyncio.Lock()
+        return lock
+
+    def load_stored_tokens(self) -> None:
+        """
+        Takes over the tokens in `token_store` if they are newer than the current ones (e.g. another client refreshed)
+        """
+        if self.token_store is None:
+            return
+        tokens = self.token_store.load(self.get_token_key())
+        if tokens is not None and self.auth_state.is_older_than(tokens):
+            self.auth_state.load_stored_tokens(tokens)
+
+    def save_stored_tokens(self) -> None:
+        """
+        Saves the current tokens to `token_store`
+        """
+        stored_tokens = self.auth_state.get_stored_tokens()
+        if self.token_store is not None and stored_tokens is not None:
+            self.token_store.save(self.get_token_key(), stored_tokens)
+
+    def get_token_key(self) -> str:
+        """
+        Returns the key of the current credentials' tokens in `token_store`
+        """
+        return get_token_key(self.auth_state.username, self.flow.tokenUrl, self.auth_state.scope)
+
+    async def _run_store_io(self, function: Callable[[], None]) -> None:
+        """
+        Runs a token store load or save on a worker thread, so file reads and locks don't block the event loop
+        """
+        if self.token_store is not None:
+            await asyncio.get_running_loop().run_in_executor(None, function)
+
+    async def refresh_expired(self) -> None:
+        """
+        Refreshes the access token if it has expired, unless a concurrent caller already did
+        """
+        async with self._get_lock():
+            if self.auth_state.is_expired():
+                await self._run_store_io(self.load_stored_tokens)
+            if self.auth_state.is_expired():
+                await self.refresh()
+
+    async def renew(self, rejected_token: Optional[str]) -> Optional[str]:
+        """
+        Refreshes the access token (or logs in again) after `rejected_token` was rejected, and returns the new token.
+
+        If a concurrent caller has already replaced the rejected token, its token is returned instead.
+        """
+        async with self._get_lock():
+            await self._run_store_io(self.load_stored_tokens)
+            access_token = self.auth_state.access_token
+            if access_token is not None and access_token != rejected_token:
+                return access_token
+            tokens = await self.refresh()
+            if tokens is None:
+                tokens = await self.login()
+            return tokens.access_token if tokens else None
+
+    def refresh_expired_sync(self) -> None:
+        with self._sync_lock:
+            if self.auth_state.is_expired():
+                self.load_stored_tokens()
+            if self.auth_state.is_expired():
+                self.refresh_sync()
+
+    def renew_sync(self, rejected_token: Optional[str]) -> Optional[str]:
+        with self._sync_lock:
+            self.load_stored_tokens()
+            access_token = self.auth_state.access_token
+            if access_token is not None and access_token != rejected_token:
+                return access_token
+            tokens = self.refresh_sync()
+            if tokens is None:
+                tokens = self.login_sync()
+            return tokens.access_token if tokens else None
+
     async def __call__(self, request: Request, call_next: Send) -> Response:
         if self.auth_state.is_expired():
-            await self.refresh()
+            await self.refresh_expired()
         access_token = self.auth_state.access_token
         if access_token is not None:
             self.set_access_header(access_token, request, replace=False)
@@ -96,16 +290,97 @@ class AuthMiddleware:
 
         if response.status_code != HTTP_401_UNAUTHORIZED:
             return response
-        tokens = await self.refresh()
-        if tokens is None:
-            tokens = await self.login()
-        if tokens:
-            self.set_access_header(tokens.access_token, request, replace=True)
-            return await call_next(request)  # note: won't work with streaming input
+        new_token = await self.renew(access_token)
+        if new_token and is_replayable(request):
+            await response.aclose()
+            self.set_access_header(new_token, request, replace=True)
+            return await call_next(request)
         return response
 
+    def call_sync(self, request: Request, call_next: SendSync) -> Response:
+        if self.auth_state.is_expired():
+            self.refresh_expired_sync()
+        access_token = self.auth_state.access_token
+        if access_token is not None:
+            self.set_access_header(access_token, request, replace=False)
+
+        response = call_next(request)
+
+        if response.status_code != HTTP_401_UNAUTHORIZED:
+            return response
+        new_token = self.renew_sync(access_token)
+        if new_token and is_replayable(request):
+            response.close()
+            self.set_access_header(new_token, request, replace=True)
+            return call_next(request)
+        return response
+
+    def get_refresh_delay(self, margin: float) -> Optional[float]:
+        """
+        Returns the seconds until the access token should be refreshed (`margin` seconds before it expires), or None
+        if it can't be refreshed
+        """
+        expires_at = self.auth_state.expires_at
+        if expires_at is None or self.auth_state.refresh_token is None:
+            return None
+        return max((expires_at - datetime.utcnow()).total_seconds() - margin, 0.0)
+
+    def start_refresh_task(self, margin: float = 60.0, retry_interval: float = 5.0) -> "asyncio.Task[None]":
+        """
+        Starts a task (in the running event loop) that refreshes the access token `margin` seconds before it
+        expires; failed refreshes are retried every `retry_interval` seconds. Cancel the task to stop it.
+        """
+        return asyncio.ensure_future(self._refresh_ahead(margin, retry_interval))
+
+    def start_refresh_thread(self, margin: float = 60.0, retry_interval: float = 5.0) -> threading.Event:
+        """
+        Like `start_refresh_task`, but refreshes from a daemon thread, for sync clients. Set the returned event to
+        stop the thread.
+        """
+        stop = threading.Event()
+        thread = threading.Thread(target=self._refresh_ahead_sync, args=(margin, retry_interval, stop), daemon=True)
+        thread.start()
+        return stop
+
+    async def _refresh_ahead(self, margin: float, retry_interval: float) -> None:
+        while True:
+            delay = self.get_refresh_delay(margin)
+            await asyncio.sleep(retry_interval if delay is None else delay)
+            if not await self._refresh_due(margin):
+                await asyncio.sleep(retry_interval)
+
+    def _refresh_ahead_sync(self, margin: float, retry_interval: float, stop: threading.Event) -> None:
+        while True:
+            delay = self.get_refresh_delay(margin)
+            if stop.wait(retry_interval if delay is None else delay):
+                return
+            if not self._refresh_due_sync(margin) and stop.wait(retry_interval):
+                return
+
+    async def _refresh_due(self, margin: float) -> bool:
+        """
+        Refreshes the access token if it is due, and returns False if that failed
+        """
+        async with self._get_lock():
+            await self._run_store_io(self.load_stored_tokens)
+            if self.get_refresh_delay(margin) != 0.0:
+                return True  # not due (any more), or can't be refreshed
+            with suppress(HTTPError):
+                return await self.refresh() is not None and self.get_refresh_delay(margin) != 0.0
+            return False
+
+    def _refresh_due_sync(self, margin: float) -> bool:
+        with self._sync_lock:
+            self.load_stored_tokens()
+            if self.get_refresh_delay(margin) != 0.0:
+                return True
+            with suppress(HTTPError):
+                return self.refresh_sync() is not None and self.get_refresh_delay(margin) != 0.0
+            return False
+
     def update_auth_state(self, tokens: TokenSuccessResponse) -> None:
         """
-        Override this function if you want a hook for caching the access/refresh tokens
+        Updates the auth state with new tokens (which are then saved to `token_store`). Override this function if you
+        want a hook for new tokens.
         """
         self.auth_state.update(tokens)
@@ -0,0 +1,170 @@
+"""
+Running many operations at once with bounded concurrency.
+
+Each call is given as a zero-argument callable (e.g. `functools.partial(apis.pet_api.get_pet_by_id, pet_id=1)`);
+async batches also accept awaitables such as the (not yet awaited) coroutine `apis.pet_api.get_pet_by_id(pet_id=1)`.
+Calls are started lazily, so `calls` may be a generator. An exception raised by a call is captured in its
+`BatchResult` instead of aborting the batch.
+"""
+import asyncio
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import (
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Dict,
+    Generic,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Set,
+    TypeVar,
+    Union,
+)
+
+T = TypeVar("T")
+
+AsyncCall = Union[Callable[[], Awaitable[T]], Awaitable[T]]
+SyncCall = Callable[[], T]
+
+DEFAULT_CONCURRENCY = 10
+
+
+class BatchResult(Generic[T]):
+    """
+    The outcome of one call of a batch: `index` is the call's position in the submitted calls
+    """
+
+    __slots__ = ("index", "value", "error")
+
+    def __init__(self, index: int, value: Optional[T] = None, error: Optional[Exception] = None) -> None:
+        self.index = index
+        self.value = value
+        self.error = error
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+    def result(self) -> T:
+        """
+        Returns the call's return value, or raises the exception the call raised
+        """
+        if self.error is not None:
+            raise self.error
+        return self.value  # type: ignore
+
+    def __repr__(self) -> str:
+        if self.error is not None:
+            return f"BatchResult(index={self.index}, error={self.error!r})"
+        return f"BatchResult(index={self.index}, value={self.value!r})"
+
+
+async def _run_async(index: int, call: AsyncCall[T]) -> BatchResult[T]:
+    try:
+        awaitable = call() if callable(call) else call
+        return BatchResult(index, value=await awaitable)
+    except Exception as e:
+        return BatchResult(index, error=e)
+
+
+async def run_batch_as_completed(
+    calls: Iterable[AsyncCall[T]], concurrency: int = DEFAULT_CONCURRENCY
+) -> AsyncIterator[BatchResult[T]]:
+    """
+    Runs the calls with at most `concurrency` of them in flight, yielding results in completion order.
+
+    If the iteration is stopped early, the calls still in flight are cancelled, and the rest aren't taken from `calls`.
+    """
+    if concurrency < 1:
+        raise ValueError("concurrency must be at least 1")
+    pending_calls = enumerate(calls)
+    in_flight: Dict["asyncio.Future[BatchResult[T]]", AsyncCall[T]] = {}
+    loop = asyncio.get_running_loop()
+
+    def start_next() -> bool:
+        try:
+            index, call = next(pending_calls)
+        except StopIteration:
+            return False
+        in_flight[loop.create_task(_run_async(index, call))] = call
+        return True
+
+    try:
+        while len(in_flight) < concurrency and start_next():
+            pass
+        while in_flight:
+            done, _ = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                del in_flight[task]
+                start_next()
+            for task in done:
+                yield task.result()
+    finally:
+        for task in in_flight:
+            task.cancel()
+        if in_flight:
+            await asyncio.wait(in_flight)
+        for call in in_flight.values():
+            if asyncio.iscoroutine(call):
+                call.close()  # a no-op if it ran; avoids "coroutine was never awaited" warnings if it didn't
+
+
+async def run_batch(calls: Iterable[AsyncCall[T]], concurrency: int = DEFAULT_CONCURRENCY) -> List[BatchResult[T]]:
+    """
+    Runs the calls with at most `concurrency` of them in flight, returning the results in the order of `calls`
+    """
+    results = [result async for result in run_batch_as_completed(calls, concurrency)]
+    results.sort(key=lambda result: result.index)
+    return results
+
+
+def _run_sync(index: int, call: SyncCall[T]) -> BatchResult[T]:
+    try:
+        return BatchResult(index, value=call())
+    except Exception as e:
+        return BatchResult(index, error=e)
+
+
+def run_batch_sync_as_completed(
+    calls: Iterable[SyncCall[T]], concurrency: int = DEFAULT_CONCURRENCY
+) -> Iterator[BatchResult[T]]:
+    """
+    Runs the calls on up to `concurrency` threads, yielding results in completion order.
+
+    If the iteration is stopped early, calls that haven't started yet are skipped; running calls are waited for.
+    """
+    if concurrency < 1:
+        raise ValueError("concurrency must be at least 1")
+    pending_calls = enumerate(calls)
+    in_flight: Set["Future[BatchResult[T]]"] = set()
+
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="api-batch") as executor:
+
+        def start_next() -> bool:
+            try:
+                index, call = next(pending_calls)
+            except StopIteration:
+                return False
+            in_flight.add(executor.submit(_run_sync, index, call))
+            return True
+
+        while len(in_flight) < concurrency and start_next():
+            pass
+        while in_flight:
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                in_flight.remove(future)
+                start_next()
+            for future in done:
+                yield future.result()
+
+
+def run_batch_sync(calls: Iterable[SyncCall[T]], concurrency: int = DEFAULT_CONCURRENCY) -> List[BatchResult[T]]:
+    """
+    Runs the calls on up to `concurrency` threads, returning the results in the order of `calls`
+    """
+    results = list(run_batch_sync_as_completed(calls, concurrency))
+    results.sort(key=lambda result: result.index)
+    return results
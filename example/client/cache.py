@@ -0,0 +1,235 @@
+"""
+Client-side HTTP caching, following the parts of RFC 7234 that matter for a private cache:
+
+* responses to GET requests are stored when they carry `Cache-Control: max-age` or a validator (`ETag` /
+  `Last-Modified`); `no-store` responses are never stored, `no-cache` ones are always revalidated
+* stale entries are revalidated with `If-None-Match` / `If-Modified-Since`, and a `304 Not Modified` is answered
+  with the stored response
+* requests can ask for revalidation with `Cache-Control: no-cache` or `max-age`, and `no-store` ones bypass the cache
+* entries are keyed by the request's `Authorization` header too, so a cache shared by clients with different
+  credentials never answers one with a response to another (add the cache before `AuthMiddleware`, so it runs after
+  the header is set)
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Collection, Dict, Optional, Tuple
+
+from httpx import Request, Response, ResponseNotRead
+
+from example.client.api_client import PARSED_RESULTS, Send, SendSync
+
+HTTP_200_OK = 200
+HTTP_304_NOT_MODIFIED = 304
+
+
+def parse_cache_control(value: Optional[str]) -> Dict[str, Optional[str]]:
+    directives: Dict[str, Optional[str]] = {}
+    for directive in (value or "").split(","):
+        name, _, argument = directive.strip().partition("=")
+        if name:
+            directives[name.lower()] = argument.strip('"') if argument else None
+    return directives
+
+
+def _get_seconds(value: Optional[str]) -> float:
+    try:
+        return max(float(value or 0), 0.0)
+    except ValueError:
+        return 0.0
+
+
+def get_cache_key(request: Request) -> str:
+    """
+    Returns the key of the request's responses: its method and URL, and a hash of its `Authorization` header
+    """
+    key = f"{request.method} {request.url}"
+    authorization = request.headers.get("authorization")
+    if authorization is not None:
+        key += " " + hashlib.sha256(authorization.encode("utf-8")).hexdigest()
+    return key
+
+
+class CacheEntry:
+    def __init__(self, request: Request, response: Response, now: float) -> None:
+        self.response = response
+        self.stored_at = now
+        self.expires_at = now
+        self.generated_at = now
+        self.vary = {
+            name.strip().lower(): request.headers.get(name.strip())
+            for name in response.headers.get("vary", "").split(",")
+            if name.strip()
+        }
+        self.size = len(response.content) + sum(len(name) + len(value) for name, value in response.headers.raw)
+        self.update(response, now)
+
+    def update(self, response: Response, now: float) -> None:
+        """
+        Updates freshness and validators from a response to the original request or to a revalidation
+        """
+        cache_control = parse_cache_control(response.headers.get("cache-control"))
+        if "no-cache" in cache_control:
+            self.expires_at = now
+        elif "max-age" in cache_control:
+            age = _get_seconds(response.headers.get("age"))
+            self.expires_at = now + _get_seconds(cache_control["max-age"]) - age
+            self.generated_at = now - age
+        for name in ("etag", "last-modified"):
+            if name in response.headers:
+                self.response.headers[name] = response.headers[name]
+
+    def matches(self, request: Request) -> bool:
+        return all(request.headers.get(name) == value for name, value in self.vary.items())
+
+    def is_fresh(self, now: float, max_age: float = None) -> bool:
+        """
+        Returns True if the entry can be used without revalidation (and is at most `max_age` seconds old, if set)
+        """
+        return now < self.expires_at and (max_age is None or now - self.generated_at <= max_age)
+
+    def add_validators(self, request: Request) -> None:
+        etag = self.response.headers.get("etag")
+        if etag is not None:
+            request.headers.setdefault("if-none-match", etag)
+        last_modified = self.response.headers.get("last-modified")
+        if last_modified is not None:
+            request.headers.setdefault("if-modified-since", last_modified)
+
+
+class ResponseCache:
+    """
+    An in-memory LRU of cache entries, bounded by number of entries and by total size in bytes.
+
+    Entries are dropped `ttl` seconds after they were stored, even if they could still be revalidated.
+    """
+
+    def __init__(self, max_entries: int = 1024, max_bytes: int = 64 * 1024 * 1024, ttl: float = 3600) -> None:
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.size = 0
+        self._entries: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str, now: float) -> Optional[CacheEntry]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry.stored_at + self.ttl <= now:
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key: str, entry: CacheEntry) -> None:
+        if entry.size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = entry
+            self.size += entry.size
+            while len(self._entries) > self.max_entries or self.size > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key)
+        self.size -= entry.size
+
+
+class CacheMiddleware:
+    """
+    Caches responses to GET requests.
+
+    Cached responses are shared: a hit (or a `304 Not Modified`) returns the stored response, and
+    `ApiClient.handle_response` reuses the result it parsed the first time instead of parsing it again.
+    This means callers of cached operations receive the same model instances, so they shouldn't modify them.
+    """
+
+    def __init__(self, cache: ResponseCache = None, methods: Collection[str] = ("GET",)) -> None:
+        self.cache = cache if cache is not None else ResponseCache()
+        self.methods = methods
+
+    async def __call__(self, request: Request, call_next: Send) -> Response:
+        now = time.monotonic()
+        key, entry, fresh = self._lookup(request, now)
+        if key is None:
+            return await call_next(request)
+        if entry is not None and fresh:
+            return entry.response
+
+        response = await call_next(request)
+
+        if entry is not None and response.status_code == HTTP_304_NOT_MODIFIED:
+            await response.aclose()
+        return self._handle_response(key, entry, request, response, now)
+
+    def call_sync(self, request: Request, call_next: SendSync) -> Response:
+        now = time.monotonic()
+        key, entry, fresh = self._lookup(request, now)
+        if key is None:
+            return call_next(request)
+        if entry is not None and fresh:
+            return entry.response
+
+        response = call_next(request)
+
+        if entry is not None and response.status_code == HTTP_304_NOT_MODIFIED:
+            response.close()
+        return self._handle_response(key, entry, request, response, now)
+
+    def _lookup(self, request: Request, now: float) -> Tuple[Optional[str], Optional[CacheEntry], bool]:
+        """
+        Returns the cache key (None if the request can't be cached), the matching entry, if any, and whether the
+        entry can be returned without revalidation.
+
+        If the entry is stale (or the request asks for revalidation), validators are added to the request so the
+        server can answer with a 304.
+        """
+        if request.method not in self.methods:
+            return None, None, False
+        cache_control = parse_cache_control(request.headers.get("cache-control"))
+        if "no-store" in cache_control:
+            return None, None, False
+        key = get_cache_key(request)
+        entry = self.cache.get(key, now)
+        if entry is None or not entry.matches(request):
+            return key, None, False
+        max_age = _get_seconds(cache_control["max-age"]) if "max-age" in cache_control else None
+        fresh = "no-cache" not in cache_control and entry.is_fresh(now, max_age)
+        if not fresh:
+            entry.add_validators(request)
+        return key, entry, fresh
+
+    def _handle_response(
+        self, key: str, entry: Optional[CacheEntry], request: Request, response: Response, now: float
+    ) -> Response:
+        if entry is not None and response.status_code == HTTP_304_NOT_MODIFIED:
+            entry.update(response, now)
+            return entry.response
+        if response.status_code == HTTP_200_OK and self._is_storable(response):
+            response.extensions[PARSED_RESULTS] = {}
+            self.cache.put(key, CacheEntry(request, response, now))
+        return response
+
+    @staticmethod
+    def _is_storable(response: Response) -> bool:
+        try:
+            response.content
+        except ResponseNotRead:
+            return False  # streamed responses aren't cached
+        cache_control = parse_cache_control(response.headers.get("cache-control"))
+        if "no-store" in cache_control or response.headers.get("vary") == "*":
+            return False
+        return "max-age" in cache_control or "etag" in response.headers or "last-modified" in response.headers
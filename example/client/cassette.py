@@ -0,0 +1,190 @@
+"""
+Recording and replaying responses, for benchmarking the client (encoding, middleware, parsing) without a network.
+
+Set `ApiClient.cassette` to a `Cassette`; it takes the place of the network at `ApiClient.send_inner`, so all
+middleware still runs:
+
+* in `record` mode, responses from the server are recorded; `save` writes them to the cassette file (gzipped JSON
+  lines, one per response)
+* in `replay` mode, responses are served from memory, after the `latency` (seconds, or `"recorded"` for the
+  latencies that were recorded); requests that weren't recorded raise `exceptions.CassetteMissError`
+
+Responses are keyed by operation id (or URL template) and the normalized request: method, percent-encoded path and
+sorted query, and a hash of the body (streamed bodies, like file uploads, aren't hashed). Responses recorded more
+than once for a key are replayed in the order they were recorded, starting over after the last one.
+"""
+import asyncio
+import base64
+import gzip
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from typing import Any, Collection, Dict, List, Optional, Tuple, Union
+from urllib.parse import urlencode
+
+from httpx import ByteStream, Request, Response
+
+from example.client.api_client import get_operation_id, get_url_template
+from example.client.exceptions import CassetteMissError
+
+RECORD = "record"
+REPLAY = "replay"
+RECORDED = "recorded"
+
+# decoded bodies are recorded, so the headers describing the encoding on the wire are dropped
+SKIPPED_HEADERS = ("content-encoding", "content-length", "transfer-encoding", "connection", "date")
+
+
+class RecordedResponse:
+    __slots__ = ("status_code", "headers", "content", "elapsed")
+
+    def __init__(self, status_code: int, headers: List[Tuple[str, str]], content: bytes, elapsed: float) -> None:
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+        self.elapsed = elapsed
+
+    def to_json(self, key: Tuple[str, str]) -> Dict[str, Any]:
+        try:
+            body, encoding = self.content.decode("utf-8"), "utf-8"
+        except UnicodeDecodeError:
+            body, encoding = base64.b64encode(self.content).decode("ascii"), "base64"
+        return {
+            "operation": key[0],
+            "request": key[1],
+            "status": self.status_code,
+            "headers": self.headers,
+            "body": body,
+            "encoding": encoding,
+            "elapsed": round(self.elapsed, 6),
+        }
+
+    @classmethod
+    def from_json(cls, data: Dict[str, Any]) -> "RecordedResponse":
+        body = data["body"]
+        content = base64.b64decode(body) if data["encoding"] == "base64" else body.encode("utf-8")
+        return cls(data["status"], [(name, value) for name, value in data["headers"]], content, data["elapsed"])
+
+
+class Cassette:
+    """
+    Records responses (`mode="record"`) or replays them (`mode="replay"`, loading `path` if it exists).
+
+    `match_headers` adds request headers to the key, for servers whose responses depend on them.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        mode: str = REPLAY,
+        *,
+        latency: Union[float, str] = 0.0,
+        match_headers: Collection[str] = (),
+    ) -> None:
+        if mode not in (RECORD, REPLAY):
+            raise ValueError(f"Unknown cassette mode {mode!r}, expected one of {[RECORD, REPLAY]}")
+        self.path = path
+        self.mode = mode
+        self.latency = latency
+        self.match_headers = tuple(sorted(header.lower() for header in match_headers))
+        self.responses: Dict[Tuple[str, str], List[RecordedResponse]] = {}
+        self._next: Dict[Tuple[str, str], int] = {}
+        self._lock = threading.Lock()
+        if mode == REPLAY and path is not None and os.path.exists(path):
+            self.load(path)
+
+    @property
+    def replaying(self) -> bool:
+        return self.mode == REPLAY
+
+    def get_key(self, request: Request) -> Tuple[str, str]:
+        """
+        Returns the operation id (or URL template) and the normalized request
+        """
+        url = request.url
+        path = url.raw_path.split(b"?", 1)[0].decode("ascii")  # still percent-encoded, so "a%2Fb" isn't "a/b"
+        query = urlencode(sorted(url.params.multi_items()))
+        if isinstance(request.stream, ByteStream):
+            body = hashlib.sha256(request.content).hexdigest()[:32] if request.content else "-"
+        else:
+            body = "stream"
+        normalized = f"{request.method} {path}?{query} {body}"
+        for header in self.match_headers:
+            normalized += f" {header}={request.headers.get(header, '')}"
+        return get_operation_id(request) or get_url_template(request), normalized
+
+    def record(self, request: Request, response: Response) -> None:
+        """
+        Records the response (which must have been read) for the request
+        """
+        try:
+            elapsed = response.elapsed.total_seconds()
+        except RuntimeError:
+            elapsed = 0.0
+        headers = [(name, value) for name, value in response.headers.items() if name.lower() not in SKIPPED_HEADERS]
+        recorded = RecordedResponse(response.status_code, headers, response.content, elapsed)
+        key = self.get_key(request)
+        with self._lock:
+            self.responses.setdefault(key, []).append(recorded)
+
+    async def replay(self, request: Request) -> Response:
+        response, delay = self._replay(request)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        return response
+
+    def replay_sync(self, request: Request) -> Response:
+        response, delay = self._replay(request)
+        if delay > 0:
+            time.sleep(delay)
+        return response
+
+    def _replay(self, request: Request) -> Tuple[Response, float]:
+        key = self.get_key(request)
+        with self._lock:
+            responses = self.responses.get(key)
+            if not responses:
+                raise CassetteMissError(key)
+            index = self._next.get(key, 0)
+            self._next[key] = (index + 1) % len(responses)
+        recorded = responses[index]
+        response = Response(recorded.status_code, headers=recorded.headers, content=recorded.content, request=request)
+        delay = recorded.elapsed if self.latency == RECORDED else float(self.latency)
+        return response, delay
+
+    def load(self, path: str) -> None:
+        with gzip.open(path, "rt", encoding="utf-8") as file:
+            for line in file:
+                data = json.loads(line)
+                key = (data["operation"], data["request"])
+                self.responses.setdefault(key, []).append(RecordedResponse.from_json(data))
+
+    def save(self, path: str = None) -> None:
+        """
+        Writes the recorded responses to `path` (by default the cassette's path), replacing the file atomically
+        """
+        path = path if path is not None else self.path
+        if path is None:
+            raise ValueError("No path to save the cassette to")
+        with self._lock:
+            items = [(key, list(responses)) for key, responses in self.responses.items()]
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), prefix=".cassette-")
+        try:
+            with os.fdopen(fd, "wb") as raw, gzip.open(raw, "wt", encoding="utf-8") as file:
+                for key, responses in items:
+                    for recorded in responses:
+                        file.write(json.dumps(recorded.to_json(key), separators=(",", ":")) + "\n")
+            os.replace(temp_path, path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+
+    def __enter__(self) -> "Cassette":
+        return self
+
+    def __exit__(self, exc_type: Any, exc_value: Any, traceback: Any) -> None:
+        if self.mode == RECORD and exc_type is None and self.path is not None:
+            self.save()
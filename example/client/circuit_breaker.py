@@ -0,0 +1,220 @@
+"""
+Circuit breaking, so callers fail fast instead of waiting on a dependency that is down.
+
+Each circuit starts closed. When the failure rate over the last `window` seconds reaches `failure_rate_threshold`
+(once at least `minimum_calls` calls were made), the circuit opens and requests fail immediately with
+`CircuitOpenError`. After `open_duration` seconds it becomes half-open: up to `half_open_calls` trial requests
+are let through, and the circuit closes if they all succeed or opens again if one fails.
+"""
+import threading
+import time
+from typing import Collection, Dict, List, Optional, Tuple
+
+from httpx import Request, Response
+
+from example.client.api_client import Send, SendSync, get_url_template
+from example.client.exceptions import CircuitOpenError, ResponseHandlingException
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+FAILURE_STATUS_CODES = (500, 502, 503, 504)
+
+CircuitKey = Tuple[str, ...]
+
+
+class CircuitBreaker:
+    def __init__(
+        self,
+        failure_rate_threshold: float = 0.5,
+        minimum_calls: int = 10,
+        window: int = 10,
+        open_duration: float = 30.0,
+        half_open_calls: int = 1,
+    ) -> None:
+        self.failure_rate_threshold = failure_rate_threshold
+        self.minimum_calls = minimum_calls
+        self.window = window
+        self.open_duration = open_duration
+        self.half_open_calls = half_open_calls
+        self.state = CLOSED
+        self.opened_at = 0.0
+        self._calls: List[int] = [0] * window
+        self._failures: List[int] = [0] * window
+        self._second = 0
+        self._trial_calls = 0
+        self._trial_successes = 0
+        self._lock = threading.Lock()
+
+    def try_acquire(self, now: float) -> Optional[float]:
+        """
+        Returns None if a call may be made, or else the number of seconds until the circuit becomes half-open
+        """
+        with self._lock:
+            if self.state == OPEN:
+                if now < self.opened_at + self.open_duration:
+                    return self.opened_at + self.open_duration - now
+                self.state = HALF_OPEN
+                self._trial_calls = 0
+                self._trial_successes = 0
+            if self.state == HALF_OPEN:
+                if self._trial_calls >= self.half_open_calls:
+                    return 0.0
+                self._trial_calls += 1
+            return None
+
+    def release(self) -> None:
+        """
+        Gives back an acquired call that was never made (or whose outcome is unknown, e.g. it was cancelled)
+        """
+        with self._lock:
+            if self.state == HALF_OPEN and self._trial_calls > 0:
+                self._trial_calls -= 1
+
+    def record(self, success: bool, now: float) -> None:
+        with self._lock:
+            if self.state == HALF_OPEN:
+                if not success:
+                    self._open(now)
+                else:
+                    self._trial_successes += 1
+                    if self._trial_successes >= self.half_open_calls:
+                        self._close()
+                return
+            if self.state == OPEN:
+                return  # the call was made before the circuit opened
+            index = self._advance(now)
+            self._calls[index] += 1
+            if not success:
+                self._failures[index] += 1
+                calls = sum(self._calls)
+                if calls >= self.minimum_calls and sum(self._failures) >= self.failure_rate_threshold * calls:
+                    self._open(now)
+
+    def _open(self, now: float) -> None:
+        self.state = OPEN
+        self.opened_at = now
+
+    def _close(self) -> None:
+        self.state = CLOSED
+        self._calls = [0] * self.window
+        self._failures = [0] * self.window
+
+    def _advance(self, now: float) -> int:
+        """
+        Clears the buckets of seconds that left the window, and returns the index of the current second's bucket
+        """
+        second = int(now)
+        if second != self._second:
+            for elapsed in range(self._second + 1, min(second, self._second + self.window) + 1):
+                self._calls[elapsed % self.window] = 0
+                self._failures[elapsed % self.window] = 0
+            self._second = second
+        return second % self.window
+
+
+class CircuitBreakerMiddleware:
+    """
+    Keeps a circuit per host and per operation (method and URL template, e.g. "GET /pet/{petId}"); a request
+    fails fast with `CircuitOpenError` if either of its circuits is open.
+
+    Transport errors and responses with a status code in `failure_status_codes` count as failures.
+    The keyword arguments configure the circuits (see `CircuitBreaker`).
+    """
+
+    def __init__(
+        self,
+        *,
+        failure_rate_threshold: float = 0.5,
+        minimum_calls: int = 10,
+        window: int = 10,
+        open_duration: float = 30.0,
+        half_open_calls: int = 1,
+        failure_status_codes: Collection[int] = FAILURE_STATUS_CODES,
+        per_host: bool = True,
+        per_operation: bool = True,
+    ) -> None:
+        self.failure_rate_threshold = failure_rate_threshold
+        self.minimum_calls = minimum_calls
+        self.window = window
+        self.open_duration = open_duration
+        self.half_open_calls = half_open_calls
+        self.failure_status_codes = failure_status_codes
+        self.per_host = per_host
+        self.per_operation = per_operation
+        self.breakers: Dict[CircuitKey, CircuitBreaker] = {}
+        self._lock = threading.Lock()
+
+    def get_keys(self, request: Request) -> List[CircuitKey]:
+        host = request.url.netloc.decode("ascii")
+        keys: List[CircuitKey] = []
+        if self.per_host:
+            keys.append((host,))
+        if self.per_operation:
+            keys.append((host, request.method, get_url_template(request)))
+        return keys
+
+    def get_breaker(self, key: CircuitKey) -> CircuitBreaker:
+        breaker = self.breakers.get(key)
+        if breaker is None:
+            with self._lock:
+                breaker = self.breakers.get(key)
+                if breaker is None:
+                    breaker = self.breakers[key] = CircuitBreaker(
+                        failure_rate_threshold=self.failure_rate_threshold,
+                        minimum_calls=self.minimum_calls,
+                        window=self.window,
+                        open_duration=self.open_duration,
+                        half_open_calls=self.half_open_calls,
+                    )
+        return breaker
+
+    async def __call__(self, request: Request, call_next: Send) -> Response:
+        breakers = self._acquire(request)
+        try:
+            response = await call_next(request)
+        except ResponseHandlingException:
+            self._record(breakers, success=False)
+            raise
+        except BaseException:
+            self._release(breakers)  # e.g. cancelled; the outcome is unknown
+            raise
+        self._record(breakers, success=response.status_code not in self.failure_status_codes)
+        return response
+
+    def call_sync(self, request: Request, call_next: SendSync) -> Response:
+        breakers = self._acquire(request)
+        try:
+            response = call_next(request)
+        except ResponseHandlingException:
+            self._record(breakers, success=False)
+            raise
+        except BaseException:
+            self._release(breakers)  # e.g. cancelled; the outcome is unknown
+            raise
+        self._record(breakers, success=response.status_code not in self.failure_status_codes)
+        return response
+
+    def _acquire(self, request: Request) -> List[CircuitBreaker]:
+        now = time.monotonic()
+        acquired: List[CircuitBreaker] = []
+        for key in self.get_keys(request):
+            breaker = self.get_breaker(key)
+            retry_after = breaker.try_acquire(now)
+            if retry_after is not None:
+                self._release(acquired)
+                raise CircuitOpenError(key, retry_after)
+            acquired.append(breaker)
+        return acquired
+
+    @staticmethod
+    def _release(breakers: List[CircuitBreaker]) -> None:
+        for breaker in breakers:
+            breaker.release()
+
+    @staticmethod
+    def _record(breakers: List[CircuitBreaker], *, success: bool) -> None:
+        now = time.monotonic()
+        for breaker in breakers:
+            breaker.record(success, now)
@@ -0,0 +1,148 @@
+"""
+Compression of request bodies, and negotiation of compressed responses.
+
+* Request bodies of at least `threshold` bytes are compressed with `codec` ("gzip", or "zstd" with the `zstandard`
+  package), set for the whole client or per operation id; bodies of at least `executor_threshold` bytes are
+  compressed on a worker thread by the async apis, so compression doesn't block the event loop
+* `Accept-Encoding` lists the `accept` encodings, in order of preference, that httpx can decode ("br" needs the
+  `brotli` package and "zstd" the `zstandard` package and httpx 0.27.1+), unless the request already sets it; httpx
+  decodes the responses as they are received
+
+Only request bodies held in memory (e.g. JSON) are compressed; streamed bodies (e.g. file uploads) are sent as is.
+"""
+import asyncio
+import zlib
+from fnmatch import fnmatchcase
+from importlib.util import find_spec
+from typing import Callable, Dict, Mapping, Optional, Sequence, Set, Tuple
+
+from httpx import ByteStream, Request, Response
+
+from example.client.api_client import Send, SendSync, get_operation_id
+
+GZIP = "gzip"
+ZSTD = "zstd"
+DEFAULT_ACCEPT = ("zstd", "br", "gzip", "deflate")
+
+Compressor = Callable[[bytes], bytes]
+
+
+def get_decodable() -> Set[str]:
+    """
+    Returns the encodings httpx can decode with the installed packages
+    """
+    encodings = {"gzip", "deflate"}
+    if find_spec("brotli") is not None or find_spec("brotlicffi") is not None:
+        encodings.add("br")
+    if find_spec("zstandard") is not None:
+        encodings.add("zstd")
+    return encodings
+
+
+class Compression:
+    """
+    How request bodies are compressed: with `codec` (None to send them uncompressed) at `level` (the codec's default
+    if None), if they are at least `threshold` bytes
+    """
+
+    def __init__(self, codec: Optional[str] = GZIP, threshold: int = 1024, level: int = None) -> None:
+        self.codec = codec
+        self.threshold = threshold
+        self.level = level
+        self.compress = get_compressor(codec, level) if codec is not None else None
+
+
+def get_compressor(codec: str, level: int = None) -> Compressor:
+    if codec == GZIP:
+        gzip_level = 6 if level is None else level
+        return lambda data: _gzip_compress(data, gzip_level)
+    if codec == ZSTD:
+        import zstandard
+
+        zstd_level = 3 if level is None else level
+        return lambda data: zstandard.ZstdCompressor(level=zstd_level).compress(data)  # compressors aren't thread-safe
+    raise ValueError(f"Unknown compression codec {codec!r}, expected one of {[GZIP, ZSTD]}")
+
+
+def _gzip_compress(data: bytes, level: int) -> bytes:
+    """
+    Like `gzip.compress`, but without a timestamp in the header, so equal bodies compress to equal bytes
+    """
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    return compressor.compress(data) + compressor.flush()
+
+
+class CompressionMiddleware:
+    """
+    Compresses request bodies as set by `compression` (or by `operations`, for the operation ids matching its keys,
+    wildcards allowed), and asks for compressed responses in the `accept` encodings
+    """
+
+    def __init__(
+        self,
+        compression: Compression = None,
+        *,
+        operations: Mapping[str, Compression] = None,
+        accept: Sequence[str] = DEFAULT_ACCEPT,
+        executor_threshold: int = 256 * 1024,
+    ) -> None:
+        self.compression = compression if compression is not None else Compression()
+        self.operations = dict(operations or {})
+        decodable = get_decodable()
+        self.accept_encoding = ", ".join(encoding for encoding in accept if encoding in decodable)
+        self.executor_threshold = executor_threshold
+        self._compressions: Dict[Optional[str], Compression] = {}
+
+    async def __call__(self, request: Request, call_next: Send) -> Response:
+        compression = self._get_compression(request)
+        if compression is not None:
+            codec, compress = compression
+            content = request.content
+            if len(content) >= self.executor_threshold:
+                loop = asyncio.get_running_loop()
+                compressed = await loop.run_in_executor(None, compress, content)
+            else:
+                compressed = compress(content)
+            request = _with_content(request, compressed, codec)
+        self._set_accept_encoding(request)
+        return await call_next(request)
+
+    def call_sync(self, request: Request, call_next: SendSync) -> Response:
+        compression = self._get_compression(request)
+        if compression is not None:
+            codec, compress = compression
+            request = _with_content(request, compress(request.content), codec)
+        self._set_accept_encoding(request)
+        return call_next(request)
+
+    def _get_compression(self, request: Request) -> Optional[Tuple[str, Compressor]]:
+        """
+        Returns the codec and compressor for the request's body, or None if it isn't compressed
+        """
+        if not isinstance(request.stream, ByteStream) or "Content-Encoding" in request.headers:
+            return None
+        operation_id = get_operation_id(request)
+        compression = self._compressions.get(operation_id)
+        if compression is None:
+            compression = self._compressions[operation_id] = self._find_compression(operation_id)
+        if compression.codec is None or compression.compress is None or len(request.content) < compression.threshold:
+            return None
+        return compression.codec, compression.compress
+
+    def _find_compression(self, operation_id: Optional[str]) -> Compression:
+        if operation_id is not None:
+            for pattern, compression in self.operations.items():
+                if fnmatchcase(operation_id, pattern):
+                    return compression
+        return self.compression
+
+    def _set_accept_encoding(self, request: Request) -> None:
+        if self.accept_encoding:
+            request.headers.setdefault("Accept-Encoding", self.accept_encoding)
+
+
+def _with_content(request: Request, content: bytes, codec: str) -> Request:
+    headers = request.headers.copy()
+    headers["Content-Encoding"] = codec
+    headers["Content-Length"] = str(len(content))
+    return Request(request.method, request.url, headers=headers, content=content, extensions=request.extensions)
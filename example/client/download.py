@@ -0,0 +1,103 @@
+"""
+Streaming downloads, for operations whose response is a file (binary).
+
+The response body is written to the destination in chunks while it is being received, so memory use doesn't depend
+on the size of the download. A destination can be:
+
+* a path: the body is written to a temporary file next to it, which replaces the path once the download is complete
+  (so a failed download doesn't leave a partial file behind)
+* a file object (anything with a `write` method), written from its current position
+* a writable buffer (e.g. a preallocated `bytearray`), filled from the start; `DownloadResult.size` is the number of
+  bytes written, and a body larger than the buffer raises a `ValueError`
+
+With `checksum` set to the name of a `hashlib` algorithm (e.g. "sha256"), the hex digest of the body is computed as
+it is written.
+"""
+import hashlib
+import os
+import uuid
+from typing import IO, Optional, Tuple, Union
+
+Destination = Union[str, "os.PathLike[str]", IO[bytes], bytearray, memoryview]
+
+
+class DownloadResult:
+    def __init__(self, size: int, checksum: Optional[str], content_type: Optional[str]) -> None:
+        self.size = size
+        self.checksum = checksum
+        self.content_type = content_type
+
+    def __repr__(self) -> str:
+        return f"DownloadResult(size={self.size}, checksum={self.checksum!r}, content_type={self.content_type!r})"
+
+
+class DownloadWriter:
+    """
+    Writes the chunks of a download to its destination; `close` must be called when the download ends (with the
+    exception, if it failed)
+    """
+
+    def __init__(self, destination: Destination, checksum: str = None) -> None:
+        self.size = 0
+        self._hash = hashlib.new(checksum) if checksum else None
+        self._path: Optional[str] = None
+        self._temp_path: Optional[str] = None
+        self._file: Optional[IO[bytes]] = None
+        self._buffer: Optional[memoryview] = None
+        if isinstance(destination, (str, os.PathLike)):
+            self._path = os.fspath(destination)
+            directory = os.path.dirname(os.path.abspath(self._path))
+            fd, self._temp_path = _create_temp_file(directory)
+            self._file = os.fdopen(fd, "wb")
+        elif hasattr(destination, "write"):
+            self._file = destination  # type: ignore
+        else:
+            self._buffer = memoryview(destination).cast("B")
+            if self._buffer.readonly:
+                raise TypeError("The download buffer must be writable")
+
+    @property
+    def blocking(self) -> bool:
+        """
+        True if writes go to a file (and should be kept off the event loop)
+        """
+        return self._file is not None
+
+    def write(self, chunk: bytes) -> None:
+        if self._hash is not None:
+            self._hash.update(chunk)
+        end = self.size + len(chunk)
+        if self._file is not None:
+            self._file.write(chunk)
+        elif self._buffer is not None:
+            if end > len(self._buffer):
+                raise ValueError(f"The download is larger than the buffer ({len(self._buffer)} bytes)")
+            self._buffer[self.size : end] = chunk
+        self.size = end
+
+    def close(self, error: BaseException = None) -> None:
+        if self._path is None or self._temp_path is None or self._file is None:
+            return
+        self._file.close()
+        if error is None:
+            os.replace(self._temp_path, self._path)
+        else:
+            os.unlink(self._temp_path)
+
+    def result(self, content_type: Optional[str]) -> DownloadResult:
+        checksum = self._hash.hexdigest() if self._hash is not None else None
+        return DownloadResult(self.size, checksum, content_type)
+
+
+def _create_temp_file(directory: str) -> Tuple[int, str]:
+    """
+    Creates a new file in `directory` for writing; unlike `tempfile.mkstemp` (mode 0600), the file gets the usual
+    permissions (0666 minus the umask, applied by the OS)
+    """
+    flags = os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, "O_BINARY", 0)
+    while True:
+        path = os.path.join(directory, f".download-{uuid.uuid4().hex}")
+        try:
+            return os.open(path, flags, 0o666), path
+        except FileExistsError:
+            continue
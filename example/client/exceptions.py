@@ -1,5 +1,5 @@
 import json
-from typing import Any, Dict, Optional
+from typing import Any, Dict, Optional, Tuple
 
 from httpx import Headers, Response
 
@@ -44,3 +44,28 @@ class UnexpectedResponse(ApiException):
 class ResponseHandlingException(ApiException):
     def __init__(self, source: Exception):
         self.source = source
+
+
+class CircuitOpenError(ApiException):
+    """
+    Raised instead of sending a request while the circuit for its host or operation is open
+    """
+
+    def __init__(self, key: Tuple[str, ...], retry_after: float) -> None:
+        self.key = key
+        self.retry_after = retry_after
+
+    def __str__(self) -> str:
+        return f"Circuit open for {' '.join(self.key)}; retry in {self.retry_after:.1f}s"
+
+
+class CassetteMissError(ApiException):
+    """
+    Raised when a cassette replaying responses has no response recorded for the request
+    """
+
+    def __init__(self, key: Tuple[str, str]) -> None:
+        self.key = key
+
+    def __str__(self) -> str:
+        return f"No response recorded for {self.key[0]}: {self.key[1]}"
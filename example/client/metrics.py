@@ -0,0 +1,221 @@
+"""
+Per-operation request metrics: counts by status code, request/response bytes and latency histograms.
+
+Latencies are counted in fixed log-scale buckets (doubling from 0.25ms to about 65s), from which percentiles are
+estimated. Each thread records into its own counters, so recording takes no locks; snapshots add the counters up.
+The counters of threads that have ended are folded into one set, so short-lived threads (e.g. of the sync batch
+and pagination executors) don't accumulate.
+"""
+import threading
+import time
+import weakref
+from bisect import bisect_left
+from typing import Any, Dict, List, Optional, Tuple
+
+from httpx import Request, Response, ResponseNotRead
+
+from example.client.api_client import Send, SendSync, get_operation_id, get_url_template
+
+LATENCY_BUCKETS = tuple(0.00025 * 2 ** index for index in range(19))
+PERCENTILES = (0.5, 0.95, 0.99)
+ERROR = "error"
+
+
+class OperationCounters:
+    __slots__ = ("statuses", "request_bytes", "response_bytes", "latency_sum", "latency_buckets")
+
+    def __init__(self) -> None:
+        self.statuses: Dict[str, int] = {}
+        self.request_bytes = 0
+        self.response_bytes = 0
+        self.latency_sum = 0.0
+        self.latency_buckets = [0] * (len(LATENCY_BUCKETS) + 1)  # the last bucket is +Inf
+
+
+class Metrics:
+    """
+    Collects metrics per operation; `snapshot` returns them as a dict, `to_prometheus` in the Prometheus text format.
+    """
+
+    def __init__(self, prefix: str = "api_client") -> None:
+        self.prefix = prefix
+        self._local = threading.local()
+        self._shards: List[Tuple["weakref.ref[threading.Thread]", Dict[str, OperationCounters]]] = []
+        self._retired: Dict[str, OperationCounters] = {}
+        self._lock = threading.Lock()
+
+    def record(
+        self, operation: str, status: str, latency: float, request_bytes: int = 0, response_bytes: int = 0
+    ) -> None:
+        try:
+            shard = self._local.shard
+        except AttributeError:
+            shard = self._local.shard = {}
+            with self._lock:
+                self._retire_shards()
+                self._shards.append((weakref.ref(threading.current_thread()), shard))
+        counters = shard.get(operation)
+        if counters is None:
+            counters = shard[operation] = OperationCounters()
+        counters.statuses[status] = counters.statuses.get(status, 0) + 1
+        counters.request_bytes += request_bytes
+        counters.response_bytes += response_bytes
+        counters.latency_sum += latency
+        counters.latency_buckets[bisect_left(LATENCY_BUCKETS, latency)] += 1
+
+    def _retire_shards(self) -> None:
+        """
+        Folds the counters of threads that have ended into `_retired` (called with the lock held)
+        """
+        live = []
+        for thread_ref, shard in self._shards:
+            thread = thread_ref()
+            if thread is not None and thread.is_alive():
+                live.append((thread_ref, shard))
+            else:
+                for operation, counters in shard.items():
+                    _add_counters(self._retired, operation, counters)
+        self._shards = live
+
+    def clear(self) -> None:
+        with self._lock:
+            for _, shard in self._shards:
+                shard.clear()
+            self._retired.clear()
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Returns the metrics per operation: counts by status ("error" for requests that raised), bytes,
+        latency sum, cumulative latency bucket counts by upper bound, and estimated latency percentiles
+        """
+        totals: Dict[str, OperationCounters] = {}
+        with self._lock:
+            self._retire_shards()
+            shards = [self._retired, *(shard for _, shard in self._shards)]
+            for shard in shards:
+                for operation, counters in list(shard.items()):
+                    _add_counters(totals, operation, counters)
+
+        snapshot = {}
+        for operation, total in sorted(totals.items()):
+            cumulative = []
+            running = 0
+            for count in total.latency_buckets:
+                running += count
+                cumulative.append(running)
+            snapshot[operation] = {
+                "count": running,
+                "statuses": total.statuses,
+                "request_bytes": total.request_bytes,
+                "response_bytes": total.response_bytes,
+                "latency_sum": total.latency_sum,
+                "latency_buckets": dict(zip([*LATENCY_BUCKETS, float("inf")], cumulative)),
+                "latency_percentiles": {q: estimate_percentile(cumulative, q) for q in PERCENTILES},
+            }
+        return snapshot
+
+    def to_prometheus(self) -> str:
+        prefix = self.prefix
+        snapshot = self.snapshot()
+        lines = [
+            f"# HELP {prefix}_requests_total Requests by operation and status code",
+            f"# TYPE {prefix}_requests_total counter",
+        ]
+        for operation, metrics in snapshot.items():
+            for status, count in sorted(metrics["statuses"].items()):
+                lines.append(f'{prefix}_requests_total{{operation="{_escape(operation)}",status="{status}"}} {count}')
+        for name in ("request_bytes", "response_bytes"):
+            lines.append(f"# HELP {prefix}_{name}_total {name.replace('_', ' ').capitalize()} by operation")
+            lines.append(f"# TYPE {prefix}_{name}_total counter")
+            for operation, metrics in snapshot.items():
+                lines.append(f'{prefix}_{name}_total{{operation="{_escape(operation)}"}} {metrics[name]}')
+        lines.append(f"# HELP {prefix}_request_duration_seconds Request latency by operation")
+        lines.append(f"# TYPE {prefix}_request_duration_seconds histogram")
+        for operation, metrics in snapshot.items():
+            labels = f'operation="{_escape(operation)}"'
+            for upper_bound, count in metrics["latency_buckets"].items():
+                le = "+Inf" if upper_bound == float("inf") else repr(upper_bound)
+                lines.append(f'{prefix}_request_duration_seconds_bucket{{{labels},le="{le}"}} {count}')
+            lines.append(f"{prefix}_request_duration_seconds_sum{{{labels}}} {metrics['latency_sum']}")
+            lines.append(f"{prefix}_request_duration_seconds_count{{{labels}}} {metrics['count']}")
+        return "\n".join(lines) + "\n"
+
+
+def _add_counters(totals: Dict[str, OperationCounters], operation: str, counters: OperationCounters) -> None:
+    total = totals.get(operation)
+    if total is None:
+        total = totals[operation] = OperationCounters()
+    for status, count in list(counters.statuses.items()):
+        total.statuses[status] = total.statuses.get(status, 0) + count
+    total.request_bytes += counters.request_bytes
+    total.response_bytes += counters.response_bytes
+    total.latency_sum += counters.latency_sum
+    total.latency_buckets = [a + b for a, b in zip(total.latency_buckets, counters.latency_buckets)]
+
+
+def estimate_percentile(cumulative: List[int], q: float) -> Optional[float]:
+    """
+    Estimates the `q` quantile of the latencies from cumulative bucket counts, interpolating within the bucket
+    """
+    if not cumulative or cumulative[-1] == 0:
+        return None
+    rank = q * cumulative[-1]
+    index = bisect_left(cumulative, rank)
+    if index >= len(LATENCY_BUCKETS):
+        return LATENCY_BUCKETS[-1]
+    lower_bound = LATENCY_BUCKETS[index - 1] if index > 0 else 0.0
+    lower_count = cumulative[index - 1] if index > 0 else 0
+    in_bucket = cumulative[index] - lower_count
+    fraction = (rank - lower_count) / in_bucket if in_bucket else 1.0
+    return lower_bound + (LATENCY_BUCKETS[index] - lower_bound) * fraction
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _get_response_bytes(response: Response) -> int:
+    try:
+        return len(response.content)
+    except ResponseNotRead:
+        return int(response.headers.get("content-length", 0))  # streamed; the body is read later
+
+
+class MetricsMiddleware:
+    """
+    Records each request in `metrics`, under its operation id (or URL template, for requests not built by the apis).
+
+    Add it last, so the latency includes the time spent in other middleware (e.g. retries).
+    """
+
+    def __init__(self, metrics: Metrics = None) -> None:
+        self.metrics = metrics if metrics is not None else Metrics()
+
+    async def __call__(self, request: Request, call_next: Send) -> Response:
+        start = time.perf_counter()
+        try:
+            response = await call_next(request)
+        except Exception:
+            self._record(request, None, time.perf_counter() - start)
+            raise
+        self._record(request, response, time.perf_counter() - start)
+        return response
+
+    def call_sync(self, request: Request, call_next: SendSync) -> Response:
+        start = time.perf_counter()
+        try:
+            response = call_next(request)
+        except Exception:
+            self._record(request, None, time.perf_counter() - start)
+            raise
+        self._record(request, response, time.perf_counter() - start)
+        return response
+
+    def _record(self, request: Request, response: Optional[Response], latency: float) -> None:
+        operation = get_operation_id(request) or get_url_template(request)
+        request_bytes = int(request.headers.get("content-length", 0))
+        if response is None:
+            self.metrics.record(operation, ERROR, latency, request_bytes)
+        else:
+            status = str(response.status_code)
+            self.metrics.record(operation, status, latency, request_bytes, _get_response_bytes(response))
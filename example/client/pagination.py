@@ -0,0 +1,261 @@
+"""
+Auto-pagination, for the `iter_*` methods generated for operations with the `x-pagination` extension.
+
+The extension's value is the style of pagination, or `true` to infer it from the operation's parameters:
+
+* `offset`: the offset parameter (`offset`, `skip` or `start`) is advanced by the number of items per page
+* `page`: the page number parameter (`page` or `page_number`) is advanced by one, starting at 1 unless given
+* `cursor`: the cursor parameter (`cursor`, `page_token`, `next_token` or `after`) is set from the previous
+  response's next cursor field (`next_cursor`, `next_page_token`, `next_token` or `next`)
+
+A page's items are the response, if it's a list, or its `items`, `data` or `results` field. The page size is the
+size of the first page, rather than the limit parameter (`limit`, `page_size`, `per_page` or `size`), since servers
+may return fewer items than asked for; offset and page number pagination ends with a page smaller than the first
+one (or an empty one), cursor pagination with a page without a next cursor.
+
+Offset and page number pages don't depend on each other, so up to `prefetch` pages after the current one are
+requested while its items are consumed; cursor pages depend on the previous response, so only the next page can be
+prefetched. When the iteration ends, the prefetched requests are cancelled (the sync iterators wait for the ones
+already being sent, rather than leaving them running on the executor's threads).
+"""
+import asyncio
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, AsyncIterator, Awaitable, Callable, Deque, Dict, Iterable, Iterator, List, Optional
+
+OFFSET = "offset"
+PAGE = "page"
+CURSOR = "cursor"
+
+PAGE_PARAMS = {
+    OFFSET: ("offset", "skip", "start"),
+    PAGE: ("page", "page_number"),
+    CURSOR: ("cursor", "page_token", "next_token", "after"),
+}
+LIMIT_PARAMS = ("limit", "page_size", "per_page", "size")
+ITEMS_FIELDS = ("items", "data", "results")
+NEXT_CURSOR_FIELDS = ("next_cursor", "next_page_token", "next_token", "next")
+
+
+class Pagination:
+    """
+    How an operation is paginated: `param` selects the page (offset, page number or cursor), `limit_param` (if any)
+    sets the page size
+    """
+
+    def __init__(self, style: str, param: str, limit_param: Optional[str] = None) -> None:
+        if style not in PAGE_PARAMS:
+            raise ValueError(f"Unknown pagination style {style!r}, expected one of {list(PAGE_PARAMS)}")
+        self.style = style
+        self.param = param
+        self.limit_param = limit_param
+
+    @classmethod
+    def detect(cls, style: str, params: Iterable[str]) -> "Pagination":
+        """
+        Returns the pagination of an operation with the given parameters, for the `x-pagination` value `style`
+        """
+        params = list(params)
+        if style.lower() == "true":
+            styles = list(PAGE_PARAMS)
+        elif style in PAGE_PARAMS:
+            styles = [style]
+        else:
+            raise ValueError(f"Unknown pagination style {style!r}, expected one of {list(PAGE_PARAMS)}")
+        for candidate in styles:
+            param = _find(params, PAGE_PARAMS[candidate])
+            if param is not None:
+                return cls(candidate, param, _find(params, LIMIT_PARAMS))
+        raise ValueError(f"No {' or '.join(styles)} pagination parameter among {params}")
+
+    def get_start(self, kwargs: Dict[str, Any]) -> Any:
+        start = kwargs.get(self.param)
+        if start is None and self.style != CURSOR:
+            return 0 if self.style == OFFSET else 1
+        return start
+
+    def get_step(self, page_size: int) -> int:
+        return page_size if self.style == OFFSET else 1
+
+
+def paginate(
+    fetch: Callable[..., Awaitable[Any]], style: str, kwargs: Dict[str, Any], prefetch: int = 1
+) -> AsyncIterator[Any]:
+    """
+    Yields the items of the pages returned by `fetch` (an operation's method), from the page selected by `kwargs`
+    """
+    pagination = Pagination.detect(style, kwargs)
+    if pagination.style == CURSOR:
+        return _paginate_cursor(fetch, pagination, kwargs, prefetch)
+    return _paginate_numbered(fetch, pagination, kwargs, prefetch)
+
+
+def paginate_sync(fetch: Callable[..., Any], style: str, kwargs: Dict[str, Any], prefetch: int = 1) -> Iterator[Any]:
+    """
+    Sync variant of `paginate`; prefetched pages are requested from a thread pool
+    """
+    pagination = Pagination.detect(style, kwargs)
+    if pagination.style == CURSOR:
+        return _paginate_cursor_sync(fetch, pagination, kwargs, prefetch)
+    return _paginate_numbered_sync(fetch, pagination, kwargs, prefetch)
+
+
+async def _paginate_numbered(
+    fetch: Callable[..., Awaitable[Any]], pagination: Pagination, kwargs: Dict[str, Any], prefetch: int
+) -> AsyncIterator[Any]:
+    start = pagination.get_start(kwargs)
+    items = get_items(await fetch(**{**kwargs, pagination.param: start}))  # sets the page size, so it's fetched alone
+    for item in items:
+        yield item
+    if not items:
+        return
+    page_size = len(items)
+    step = pagination.get_step(page_size)
+
+    pending: "Deque[asyncio.Future[Any]]" = deque()
+    next_page = start + step
+    try:
+        while True:
+            while len(pending) <= prefetch:
+                pending.append(asyncio.ensure_future(fetch(**{**kwargs, pagination.param: next_page})))
+                next_page += step
+            items = get_items(await pending.popleft())
+            for item in items:
+                yield item
+            if len(items) < page_size:
+                return
+    finally:
+        _cancel(pending)
+
+
+async def _paginate_cursor(
+    fetch: Callable[..., Awaitable[Any]], pagination: Pagination, kwargs: Dict[str, Any], prefetch: int
+) -> AsyncIterator[Any]:
+    page = await fetch(**kwargs)
+    next_page: "Optional[asyncio.Future[Any]]" = None
+    try:
+        while True:
+            cursor = get_next_cursor(page)
+            if cursor and prefetch > 0:
+                next_page = asyncio.ensure_future(fetch(**{**kwargs, pagination.param: cursor}))
+            for item in get_items(page):
+                yield item
+            if not cursor:
+                return
+            if next_page is None:
+                page = await fetch(**{**kwargs, pagination.param: cursor})
+            else:
+                page, next_page = await next_page, None
+    finally:
+        if next_page is not None:
+            _cancel([next_page])
+
+
+def _paginate_numbered_sync(
+    fetch: Callable[..., Any], pagination: Pagination, kwargs: Dict[str, Any], prefetch: int
+) -> Iterator[Any]:
+    start = pagination.get_start(kwargs)
+    items = get_items(fetch(**{**kwargs, pagination.param: start}))
+    yield from items
+    if not items:
+        return
+    page_size = len(items)
+    step = pagination.get_step(page_size)
+    start += step
+
+    if prefetch <= 0:
+        while True:
+            items = get_items(fetch(**{**kwargs, pagination.param: start}))
+            yield from items
+            if len(items) < page_size:
+                return
+            start += step
+
+    # one executor for the whole iteration, with a worker for the current page and each prefetched one
+    executor = ThreadPoolExecutor(max_workers=prefetch + 1)
+    pending: "Deque[Future[Any]]" = deque()
+    next_page = start
+    try:
+        while True:
+            while len(pending) <= prefetch:
+                pending.append(executor.submit(fetch, **{**kwargs, pagination.param: next_page}))
+                next_page += step
+            items = get_items(pending.popleft().result())
+            yield from items
+            if len(items) < page_size:
+                return
+    finally:
+        _shutdown(executor, pending)
+
+
+def _paginate_cursor_sync(
+    fetch: Callable[..., Any], pagination: Pagination, kwargs: Dict[str, Any], prefetch: int
+) -> Iterator[Any]:
+    page = fetch(**kwargs)
+    executor = ThreadPoolExecutor(max_workers=1) if prefetch > 0 else None
+    next_page: "Optional[Future[Any]]" = None
+    try:
+        while True:
+            cursor = get_next_cursor(page)
+            if cursor and executor is not None:
+                next_page = executor.submit(fetch, **{**kwargs, pagination.param: cursor})
+            yield from get_items(page)
+            if not cursor:
+                return
+            if next_page is None:
+                page = fetch(**{**kwargs, pagination.param: cursor})
+            else:
+                page, next_page = next_page.result(), None
+    finally:
+        if executor is not None:
+            _shutdown(executor, [next_page] if next_page is not None else [])
+
+
+def _cancel(futures: Iterable["asyncio.Future[Any]"]) -> None:
+    """
+    Cancels the prefetched pages; the errors of pages that failed before they were cancelled are retrieved, so they
+    aren't logged as never retrieved
+    """
+    for future in futures:
+        future.cancel()
+        future.add_done_callback(_retrieve_error)
+
+
+def _retrieve_error(future: "asyncio.Future[Any]") -> None:
+    if not future.cancelled():
+        future.exception()
+
+
+def _shutdown(executor: ThreadPoolExecutor, pending: Iterable["Future[Any]"]) -> None:
+    """
+    Cancels the pages that weren't requested yet and waits for the ones being requested, so no request outlives the
+    iteration
+    """
+    for future in pending:
+        future.cancel()
+    executor.shutdown(wait=True)
+
+
+def get_items(page: Any) -> List[Any]:
+    if isinstance(page, list):
+        return page
+    items = _get_field(page, ITEMS_FIELDS)
+    if items is None:
+        raise ValueError(f"No items field ({', '.join(ITEMS_FIELDS)}) in page {page!r}")
+    return items
+
+
+def get_next_cursor(page: Any) -> Any:
+    return _get_field(page, NEXT_CURSOR_FIELDS)
+
+
+def _get_field(page: Any, names: Iterable[str]) -> Any:
+    for name in names:
+        value = page.get(name) if isinstance(page, dict) else getattr(page, name, None)
+        if value is not None:
+            return value
+    return None
+
+
+def _find(params: List[str], candidates: Iterable[str]) -> Optional[str]:
+    return next((candidate for candidate in candidates if candidate in params), None)
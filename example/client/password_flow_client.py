@@ -1,17 +1,17 @@
 """
 Attempting to follow the "password" flow as described in RFC 6749: https://tools.ietf.org/html/rfc6749
 """
-from asyncio import get_event_loop
 from contextlib import suppress
 from enum import Enum
 from typing import Any, Dict, List, Optional, Type, TypeVar, Union
 
 from fastapi.openapi.models import OAuthFlowPassword
-from httpx import AsyncClient, Response
+from httpx import AsyncClient, Client, Response
 from pydantic import BaseModel, ValidationError
 from typing_extensions import Literal
 
 from example.client.exceptions import UnexpectedResponse
+from example.client.pool import PoolConfig
 
 TokenRequestT = TypeVar("TokenRequestT", bound="BaseTokenRequest")
 HTTP_200_OK = 200
@@ -87,9 +87,22 @@ def parse_token_response(response: Response) -> TokenResponse:
 
 
 class PasswordFlowClient:
-    def __init__(self, flow: OAuthFlowPassword) -> None:
+    def __init__(
+        self,
+        flow: OAuthFlowPassword,
+        pool: PoolConfig = None,
+        *,
+        async_client: AsyncClient = None,
+        sync_client: Client = None,
+    ) -> None:
+        """
+        Token requests are sent with `async_client` / `sync_client` if given (e.g. to share an `ApiClient`'s
+        connection pool), otherwise with new clients configured by `pool`
+        """
         self.flow = flow
-        self._async_client = AsyncClient()
+        client_kwargs = pool.client_kwargs() if pool is not None else {}
+        self._async_client = async_client if async_client is not None else AsyncClient(**client_kwargs)
+        self._sync_client = sync_client if sync_client is not None else Client(**client_kwargs)
 
     async def request_access_token(self, access_token_request: AccessTokenRequest) -> TokenResponse:
         response = await self._async_client.post(self.flow.tokenUrl, data=access_token_request.request_dict())
@@ -101,7 +114,10 @@ class PasswordFlowClient:
         return parse_token_response(response)
 
     def request_access_token_sync(self, access_token_request: AccessTokenRequest) -> TokenResponse:
-        return get_event_loop().run_until_complete(self.request_access_token(access_token_request))
+        response = self._sync_client.post(self.flow.tokenUrl, data=access_token_request.request_dict())
+        return parse_token_response(response)
 
     def request_refresh_token_sync(self, refresh_token_request: RefreshTokenRequest) -> TokenResponse:
-        return get_event_loop().run_until_complete(self.request_refresh_token(refresh_token_request))
+        refresh_url = self.flow.refreshUrl or self.flow.tokenUrl
+        response = self._sync_client.post(refresh_url, data=refresh_token_request.request_dict())
+        return parse_token_response(response)
@@ -0,0 +1,158 @@
+"""
+Connection pool configuration and statistics.
+
+`PoolConfig` turns the pool settings into the arguments for `httpx.AsyncClient` / `httpx.Client`; HTTP/2 needs the
+`h2` package (`pip install httpx[http2]`). `PoolStats` collects pool wait times and new connections from the
+connection-level trace events of requests (calling the trace callback a request already had, if any), and reports
+in-use and idle connections of a client's pool.
+"""
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Union
+
+from httpx import AsyncClient, Client, Limits, Request, Timeout
+from pydantic import BaseModel
+
+TraceCallback = Callable[[str, Dict[str, Any]], None]
+AsyncTraceCallback = Callable[[str, Dict[str, Any]], Awaitable[None]]
+
+# the request's own trace callback, kept for retries, which send the request again with the stats callback set
+CHAINED_TRACE = "pool_stats.chained_trace"
+
+
+class PoolConfig(BaseModel):
+    max_connections: Optional[int] = 100
+    max_keepalive_connections: Optional[int] = 20
+    keepalive_expiry: Optional[float] = 5.0
+    http2: bool = False
+    connect_timeout: Optional[float] = 5.0
+    read_timeout: Optional[float] = 5.0
+    write_timeout: Optional[float] = 5.0
+    pool_timeout: Optional[float] = 5.0
+    collect_stats: bool = False
+
+    def limits(self) -> Limits:
+        return Limits(
+            max_connections=self.max_connections,
+            max_keepalive_connections=self.max_keepalive_connections,
+            keepalive_expiry=self.keepalive_expiry,
+        )
+
+    def timeout(self) -> Timeout:
+        return Timeout(
+            connect=self.connect_timeout, read=self.read_timeout, write=self.write_timeout, pool=self.pool_timeout
+        )
+
+    def client_kwargs(self) -> Dict[str, Any]:
+        return dict(limits=self.limits(), timeout=self.timeout(), http2=self.http2)
+
+
+class PoolStatsSnapshot(BaseModel):
+    connections: int
+    in_use: int
+    idle: int
+    requests: int
+    pool_wait_total: float
+    pool_wait_max: float
+    connections_opened: int
+
+    @property
+    def pool_wait_avg(self) -> float:
+        return self.pool_wait_total / self.requests if self.requests else 0.0
+
+    @property
+    def connections_closed(self) -> int:
+        """
+        Connections opened while collecting stats that have been closed since (e.g. expired keep-alive connections)
+        """
+        return max(self.connections_opened - self.connections, 0)
+
+
+class PoolStats:
+    """
+    Counts requests, the time they waited for a connection from the pool, and the connections opened for them.
+
+    A request's pool wait ends when it starts connecting (new connection) or sending (reused connection).
+    """
+
+    def __init__(self) -> None:
+        self.requests = 0
+        self.pool_wait_total = 0.0
+        self.pool_wait_max = 0.0
+        self.connections_opened = 0
+        self._lock = threading.Lock()
+
+    def trace(self, chained: TraceCallback = None) -> TraceCallback:
+        """
+        Returns the trace callback for one request sent with an `httpx.Client`, which also calls `chained`
+        """
+        started = time.perf_counter()
+        waiting = True
+
+        def trace(event_name: str, info: Dict[str, Any]) -> None:
+            nonlocal waiting
+            if waiting and (event_name.startswith("connection.connect_") or "send_request_headers" in event_name):
+                waiting = False
+                self._record_wait(time.perf_counter() - started)
+            if event_name.startswith("connection.connect_") and event_name.endswith(".complete"):
+                with self._lock:
+                    self.connections_opened += 1
+            if chained is not None:
+                chained(event_name, info)
+
+        return trace
+
+    def trace_async(self, chained: AsyncTraceCallback = None) -> AsyncTraceCallback:
+        """
+        Returns the trace callback for one request sent with an `httpx.AsyncClient`, which also awaits `chained`
+        """
+        trace = self.trace()
+
+        async def trace_async(event_name: str, info: Dict[str, Any]) -> None:
+            trace(event_name, info)
+            if chained is not None:
+                await chained(event_name, info)
+
+        return trace_async
+
+    def snapshot(self, client: Union[AsyncClient, Client]) -> PoolStatsSnapshot:
+        connections = get_pool_connections(client)
+        in_use = sum(1 for connection in connections if not connection.is_idle())
+        with self._lock:
+            return PoolStatsSnapshot(
+                connections=len(connections),
+                in_use=in_use,
+                idle=len(connections) - in_use,
+                requests=self.requests,
+                pool_wait_total=self.pool_wait_total,
+                pool_wait_max=self.pool_wait_max,
+                connections_opened=self.connections_opened,
+            )
+
+    def _record_wait(self, wait: float) -> None:
+        with self._lock:
+            self.requests += 1
+            self.pool_wait_total += wait
+            if wait > self.pool_wait_max:
+                self.pool_wait_max = wait
+
+
+def get_chained_trace(request: Request) -> Any:
+    """
+    Returns the trace callback the request came with (None if it had none), to be chained to the stats callback
+    """
+    extensions = request.extensions
+    if CHAINED_TRACE not in extensions:
+        extensions[CHAINED_TRACE] = extensions.get("trace")
+    return extensions[CHAINED_TRACE]
+
+
+def get_pool_connections(client: Union[AsyncClient, Client]) -> List[Any]:
+    """
+    Returns the connections in the client's default connection pool.
+
+    httpx doesn't expose the pool publicly, so this returns an empty list for custom transports
+    (or if the internals change).
+    """
+    pool = getattr(getattr(client, "_transport", None), "_pool", None)
+    return list(getattr(pool, "connections", ()))
@@ -0,0 +1,182 @@
+"""
+Client-side rate limiting with token buckets.
+
+Requests wait (without blocking the event loop) until their buckets have a token, instead of being sent and
+rejected. A `429 Too Many Requests` lowers the bucket's rate (at most once per `decrease_interval`, so a burst of
+429s for requests sent at the old rate counts once) and a positive `Retry-After` header pauses it; the rate is raised
+again step by step while responses succeed.
+"""
+import asyncio
+import threading
+import time
+from typing import Dict, List, Mapping, Optional, Tuple
+
+from httpx import Request, Response
+
+from example.client.api_client import Send, SendSync, get_operation_id
+from example.client.retry import parse_retry_after
+
+HTTP_429_TOO_MANY_REQUESTS = 429
+
+BucketKey = Tuple[str, ...]
+
+
+class TokenBucket:
+    """
+    Allows `rate` requests per second on average, and bursts of up to `burst` requests.
+
+    `throttle` multiplies the rate by `decrease_factor` (down to `min_rate`), at most once per `decrease_interval`
+    seconds; `recover` adds `increase_ratio` times the configured rate back (up to the configured rate).
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        burst: float = None,
+        *,
+        min_rate: float = None,
+        decrease_factor: float = 0.5,
+        increase_ratio: float = 0.05,
+        decrease_interval: float = 1.0,
+    ) -> None:
+        self.max_rate = rate
+        self.rate = rate
+        self.burst = burst if burst is not None else max(rate, 1.0)
+        self.min_rate = min_rate if min_rate is not None else rate / 16
+        self.decrease_factor = decrease_factor
+        self.increase_ratio = increase_ratio
+        self.decrease_interval = decrease_interval
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._decreased_at = float("-inf")
+        self._lock = threading.Lock()
+
+    def reserve(self, now: float) -> float:
+        """
+        Takes a token and returns how many seconds to wait before using it (tokens are handed out in order)
+        """
+        with self._lock:
+            self._refill(now)
+            self._tokens -= 1
+            delay = -self._tokens / self.rate if self._tokens < 0 else 0.0
+            return max(delay, self._paused_until - now)
+
+    def throttle(self, now: float, retry_after: Optional[float] = None, *, decrease: bool = True) -> None:
+        """
+        Lowers the rate (if `decrease`, and it wasn't lowered in the last `decrease_interval` seconds), and pauses the
+        bucket for `retry_after` seconds
+        """
+        with self._lock:
+            self._refill(now)
+            if decrease and now - self._decreased_at >= self.decrease_interval:
+                self.rate = max(self.min_rate, self.rate * self.decrease_factor)
+                self._decreased_at = now
+            if retry_after:
+                self._paused_until = max(self._paused_until, now + retry_after)
+
+    def recover(self, now: float) -> None:
+        if self.rate >= self.max_rate:
+            return
+        with self._lock:
+            self._refill(now)
+            self.rate = min(self.max_rate, self.rate + self.max_rate * self.increase_ratio)
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+
+class RateLimitMiddleware:
+    """
+    Limits requests per host to `rate` per second (if given), with bursts of up to `burst` requests (by default one
+    second's worth), and requests for the operation ids in `operation_rates` to the given rates per second.
+
+    Add it before `RetryMiddleware` (i.e. closer to the transport) so retries are rate limited too.
+    """
+
+    def __init__(
+        self,
+        rate: float = None,
+        burst: float = None,
+        *,
+        operation_rates: Mapping[str, float] = None,
+        min_rate_ratio: float = 1 / 16,
+        decrease_factor: float = 0.5,
+        increase_ratio: float = 0.05,
+        decrease_interval: float = 1.0,
+    ) -> None:
+        self.rate = rate
+        self.burst = burst
+        self.operation_rates = operation_rates or {}
+        self.min_rate_ratio = min_rate_ratio
+        self.decrease_factor = decrease_factor
+        self.increase_ratio = increase_ratio
+        self.decrease_interval = decrease_interval
+        self.buckets: Dict[BucketKey, TokenBucket] = {}
+        self._lock = threading.Lock()
+
+    def get_buckets(self, request: Request) -> List[TokenBucket]:
+        host = request.url.netloc.decode("ascii")
+        buckets = []
+        if self.rate is not None:
+            buckets.append(self._get_bucket((host,), self.rate))
+        operation_id = get_operation_id(request)
+        if operation_id is not None and operation_id in self.operation_rates:
+            buckets.append(self._get_bucket((host, operation_id), self.operation_rates[operation_id]))
+        return buckets
+
+    def _get_bucket(self, key: BucketKey, rate: float) -> TokenBucket:
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            with self._lock:
+                bucket = self.buckets.get(key)
+                if bucket is None:
+                    bucket = self.buckets[key] = TokenBucket(
+                        rate,
+                        self.burst if len(key) == 1 else None,
+                        min_rate=rate * self.min_rate_ratio,
+                        decrease_factor=self.decrease_factor,
+                        increase_ratio=self.increase_ratio,
+                        decrease_interval=self.decrease_interval,
+                    )
+        return bucket
+
+    async def __call__(self, request: Request, call_next: Send) -> Response:
+        buckets = self.get_buckets(request)
+        if not buckets:
+            return await call_next(request)
+        delay = self._reserve(buckets)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        response = await call_next(request)
+        self._update(buckets, response)
+        return response
+
+    def call_sync(self, request: Request, call_next: SendSync) -> Response:
+        buckets = self.get_buckets(request)
+        if not buckets:
+            return call_next(request)
+        delay = self._reserve(buckets)
+        if delay > 0:
+            time.sleep(delay)
+        response = call_next(request)
+        self._update(buckets, response)
+        return response
+
+    @staticmethod
+    def _reserve(buckets: List[TokenBucket]) -> float:
+        now = time.monotonic()
+        return max(bucket.reserve(now) for bucket in buckets)
+
+    @staticmethod
+    def _update(buckets: List[TokenBucket], response: Response) -> None:
+        now = time.monotonic()
+        retry_after = parse_retry_after(response.headers.get("retry-after"))
+        too_many_requests = response.status_code == HTTP_429_TOO_MANY_REQUESTS
+        if too_many_requests or retry_after:
+            for bucket in buckets:
+                bucket.throttle(now, retry_after, decrease=too_many_requests)
+        elif response.status_code < 400:
+            for bucket in buckets:
+                bucket.recover(now)
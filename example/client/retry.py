@@ -0,0 +1,224 @@
+"""
+Retrying failed requests.
+
+* Only requests that are safe to repeat are retried: idempotent methods, requests carrying an `Idempotency-Key`
+  header, and operations explicitly opted in. Connection failures (where the request never reached the server)
+  are retried for any method.
+* Delays use exponential backoff with full jitter; a `Retry-After` header on the response takes precedence.
+* A `RetryBudget` caps retries to a fraction of recent requests, so retries can't multiply load during an outage.
+"""
+import asyncio
+import random
+import threading
+import time
+from datetime import timezone
+from email.utils import parsedate_to_datetime
+from typing import Collection, List, Optional
+
+from httpx import ByteStream, ConnectError, ConnectTimeout, PoolTimeout, Request, Response, TransportError
+
+from example.client.api_client import Send, SendSync, get_operation_id
+from example.client.exceptions import ResponseHandlingException
+from example.client.upload import MultipartEncoder
+
+IDEMPOTENT_METHODS = ("GET", "HEAD", "OPTIONS", "PUT", "DELETE")
+RETRY_STATUS_CODES = (429, 502, 503, 504)
+NOT_SENT_ERRORS = (ConnectError, ConnectTimeout, PoolTimeout)
+
+
+def is_replayable(request: Request) -> bool:
+    """
+    Returns True if the request body can be sent again: in-memory bodies, and multipart uploads whose files can be
+    read again from the start
+    """
+    stream = request.stream
+    return isinstance(stream, ByteStream) or (isinstance(stream, MultipartEncoder) and stream.replayable)
+
+
+async def ensure_replayable(request: Request) -> None:
+    """
+    Buffers a streaming request body in memory, so the request can be sent more than once
+    """
+    if not is_replayable(request):
+        await request.aread()
+
+
+def ensure_replayable_sync(request: Request) -> None:
+    if not is_replayable(request):
+        request.read()
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """
+    Returns the delay in seconds requested by a `Retry-After` header (either seconds or an HTTP date)
+    """
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(retry_at.timestamp() - time.time(), 0.0)
+
+
+class RetryBudget:
+    """
+    Allows retries while they stay below `ratio` times the number of requests in the last `window` seconds,
+    plus `min_retries_per_second` (so clients with little traffic can still retry).
+
+    A budget can be shared between several middleware (or clients) to limit their retries together.
+    """
+
+    def __init__(self, ratio: float = 0.2, min_retries_per_second: float = 1.0, window: int = 10) -> None:
+        self.ratio = ratio
+        self.min_retries_per_second = min_retries_per_second
+        self.window = window
+        self._requests: List[int] = [0] * window
+        self._retries: List[int] = [0] * window
+        self._second = 0
+        self._lock = threading.Lock()
+
+    def record_request(self) -> None:
+        with self._lock:
+            self._requests[self._advance()] += 1
+
+    def try_retry(self) -> bool:
+        """
+        Records a retry and returns True if the budget allows it
+        """
+        with self._lock:
+            index = self._advance()
+            allowed = self.min_retries_per_second * self.window + self.ratio * sum(self._requests)
+            if sum(self._retries) >= allowed:
+                return False
+            self._retries[index] += 1
+            return True
+
+    def _advance(self) -> int:
+        """
+        Clears the buckets of seconds that left the window, and returns the index of the current second's bucket
+        """
+        second = int(time.monotonic())
+        if second != self._second:
+            for elapsed in range(self._second + 1, min(second, self._second + self.window) + 1):
+                self._requests[elapsed % self.window] = 0
+                self._retries[elapsed % self.window] = 0
+            self._second = second
+        return second % self.window
+
+
+class RetryMiddleware:
+    """
+    Retries requests that failed with a transport error or a retryable status code (`RETRY_STATUS_CODES`).
+
+    `max_attempts` includes the first attempt. Requests with a method in `methods`, or an operation id in
+    `operations`, or an `Idempotency-Key` header are retried; for other requests (e.g. POST) only connection
+    failures are. Streaming request bodies of retryable requests are buffered, so they can be sent again.
+    """
+
+    def __init__(
+        self,
+        max_attempts: int = 3,
+        *,
+        methods: Collection[str] = IDEMPOTENT_METHODS,
+        operations: Collection[str] = (),
+        status_codes: Collection[int] = RETRY_STATUS_CODES,
+        backoff_base: float = 0.1,
+        backoff_max: float = 10.0,
+        max_retry_after: float = 60.0,
+        budget: RetryBudget = None,
+    ) -> None:
+        self.max_attempts = max_attempts
+        self.methods = methods
+        self.operations = operations
+        self.status_codes = status_codes
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.max_retry_after = max_retry_after
+        self.budget = budget if budget is not None else RetryBudget()
+
+    def is_idempotent(self, request: Request) -> bool:
+        return (
+            request.method in self.methods
+            or "idempotency-key" in request.headers
+            or get_operation_id(request) in self.operations
+        )
+
+    def get_delay(self, attempt: int, response: Optional[Response]) -> Optional[float]:
+        """
+        Returns the delay before retrying after `attempt` failed attempts, or None if the request shouldn't be retried
+        """
+        if response is not None:
+            retry_after = parse_retry_after(response.headers.get("retry-after"))
+            if retry_after is not None:
+                return retry_after if retry_after <= self.max_retry_after else None
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** (attempt - 1)))
+
+    def should_retry(
+        self, request: Request, attempt: int, response: Optional[Response], error: Optional[Exception]
+    ) -> Optional[float]:
+        """
+        Returns the delay before the next attempt, or None if the request shouldn't be retried
+        """
+        if attempt >= self.max_attempts:
+            return None
+        if error is not None:
+            source = error.source if isinstance(error, ResponseHandlingException) else error
+            if not isinstance(source, TransportError):
+                return None
+            if not isinstance(source, NOT_SENT_ERRORS) and not self.is_idempotent(request):
+                return None
+        elif response is None or response.status_code not in self.status_codes or not self.is_idempotent(request):
+            return None
+        if not is_replayable(request):
+            return None
+        delay = self.get_delay(attempt, response)
+        if delay is None or not self.budget.try_retry():
+            return None
+        return delay
+
+    async def __call__(self, request: Request, call_next: Send) -> Response:
+        self.budget.record_request()
+        if self.max_attempts > 1 and self.is_idempotent(request):
+            await ensure_replayable(request)
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                response = await call_next(request)
+            except Exception as e:
+                delay = self.should_retry(request, attempt, None, e)
+                if delay is None:
+                    raise
+            else:
+                delay = self.should_retry(request, attempt, response, None)
+                if delay is None:
+                    return response
+                await response.aclose()
+            await asyncio.sleep(delay)
+
+    def call_sync(self, request: Request, call_next: SendSync) -> Response:
+        self.budget.record_request()
+        if self.max_attempts > 1 and self.is_idempotent(request):
+            ensure_replayable_sync(request)
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                response = call_next(request)
+            except Exception as e:
+                delay = self.should_retry(request, attempt, None, e)
+                if delay is None:
+                    raise
+            else:
+                delay = self.should_retry(request, attempt, response, None)
+                if delay is None:
+                    return response
+                response.close()
+            time.sleep(delay)
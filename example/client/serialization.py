@@ -0,0 +1,148 @@
+"""
+JSON serialization of request bodies.
+
+Instead of converting models to dicts (and then to JSON), a writer is compiled once per model class
+and writes the model's fields straight into the JSON output.
+"""
+import json
+from datetime import date, datetime, time
+from enum import Enum
+from types import GeneratorType
+from typing import Any, Callable, Dict, List, Type
+
+from pydantic import BaseModel
+from pydantic.json import pydantic_encoder
+
+Writer = Callable[[Any, List[str]], None]
+
+_encode = json.JSONEncoder(ensure_ascii=False, separators=(",", ":")).encode
+
+
+class JsonSerializer:
+    """
+    Serializes models (by alias), containers and primitives to JSON bytes.
+
+    Writers are looked up by the exact type of each value and compiled the first time a type is seen.
+    """
+
+    def __init__(self, *, exclude_none: bool = False) -> None:
+        self.exclude_none = exclude_none
+        self._writers: Dict[type, Writer] = {
+            str: _write_encoded,
+            int: _write_int,
+            float: _write_encoded,
+            bool: _write_bool,
+            type(None): _write_none,
+        }
+
+    def serialize(self, value: Any) -> bytes:
+        out: List[str] = []
+        self.write(value, out)
+        return "".join(out).encode("utf-8")
+
+    def write(self, value: Any, out: List[str]) -> None:
+        type_ = type(value)
+        try:
+            writer = self._writers[type_]
+        except KeyError:
+            writer = self._writers[type_] = self._compile(type_)
+        writer(value, out)
+
+    def _compile(self, type_: type) -> Writer:  # noqa C901
+        if issubclass(type_, BaseModel):
+            return self._compile_model(type_)
+        if issubclass(type_, Enum):
+            return lambda value, out: self.write(value.value, out)
+        if issubclass(type_, dict):
+            return self._write_dict
+        if issubclass(type_, (list, tuple, set, frozenset, GeneratorType)):
+            return self._write_sequence
+        if issubclass(type_, (datetime, date, time)):
+            return lambda value, out: out.append(f'"{value.isoformat()}"')
+        if issubclass(type_, str):
+            return _write_encoded
+        if issubclass(type_, int):
+            return lambda value, out: out.append(int.__repr__(value))
+        if issubclass(type_, float):
+            return lambda value, out: out.append(_encode(float(value)))
+        return lambda value, out: self.write(pydantic_encoder(value), out)
+
+    def _compile_model(self, model: Type[BaseModel]) -> Writer:
+        if getattr(model.__config__, "json_encoders", None):
+            exclude_none = self.exclude_none
+            return lambda value, out: out.append(value.json(by_alias=True, exclude_none=exclude_none))
+
+        fields = [(name, _encode(field.alias) + ":") for name, field in model.__fields__.items()]
+        exclude_none = self.exclude_none
+        write = self.write
+
+        def write_model(value: BaseModel, out: List[str]) -> None:
+            values = value.__dict__
+            separator = "{"
+            for name, key in fields:
+                field_value = values.get(name)
+                if field_value is None:
+                    if exclude_none:
+                        continue
+                    out.append(separator)
+                    out.append(key)
+                    out.append("null")
+                else:
+                    out.append(separator)
+                    out.append(key)
+                    write(field_value, out)
+                separator = ","
+            out.append("{}" if separator == "{" else "}")
+
+        return write_model
+
+    def _write_dict(self, value: Dict[Any, Any], out: List[str]) -> None:
+        separator = "{"
+        for key, item in value.items():
+            if item is None and self.exclude_none:
+                continue
+            if isinstance(key, Enum):
+                key = key.value
+            out.append(separator)
+            out.append(_encode(key if isinstance(key, str) else str(key)))
+            out.append(":")
+            self.write(item, out)
+            separator = ","
+        out.append("{}" if separator == "{" else "}")
+
+    def _write_sequence(self, value: Any, out: List[str]) -> None:
+        separator = "["
+        for item in value:
+            out.append(separator)
+            self.write(item, out)
+            separator = ","
+        out.append("[]" if separator == "[" else "]")
+
+
+def _write_encoded(value: Any, out: List[str]) -> None:
+    out.append(_encode(value))
+
+
+def _write_int(value: int, out: List[str]) -> None:
+    out.append(int.__repr__(value))
+
+
+def _write_bool(value: bool, out: List[str]) -> None:
+    out.append("true" if value else "false")
+
+
+def _write_none(value: None, out: List[str]) -> None:
+    out.append("null")
+
+
+_serializer = JsonSerializer()
+_serializer_exclude_none = JsonSerializer(exclude_none=True)
+
+
+def to_json(value: Any, *, exclude_none: bool = False) -> bytes:
+    """
+    Serializes a request body to JSON bytes; models are serialized by alias
+    """
+    if exclude_none:
+        return _serializer_exclude_none.serialize(value)
+    return _serializer.serialize(value)
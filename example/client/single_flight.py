@@ -0,0 +1,129 @@
+"""
+Coalescing of identical in-flight requests ("single flight").
+
+While a request is in flight, identical requests (same method, URL including the query, and key headers) wait for
+it and receive the same response instead of going to the network themselves.
+"""
+import asyncio
+import threading
+from typing import Any, Collection, Dict, Hashable, Optional, Tuple
+
+from httpx import Request, Response, ResponseNotRead
+
+from example.client.api_client import PARSED_RESULTS, Send, SendSync, get_operation_id
+
+
+class _SyncCall:
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.response: Optional[Response] = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlightMiddleware:
+    """
+    Lets concurrent identical requests share one network call and one parsed result.
+
+    Only requests with a method in `methods` are coalesced; if `operations` is given, only requests for those
+    operation ids are. `key_headers` are the request headers that must also be equal for requests to be shared.
+
+    Followers receive the leader's response (and its parsed result), so callers shouldn't modify the returned models.
+    Streamed responses can't be shared; followers of a streamed request send their own request.
+    """
+
+    def __init__(
+        self,
+        methods: Collection[str] = ("GET", "HEAD"),
+        operations: Collection[str] = None,
+        key_headers: Collection[str] = ("accept", "authorization"),
+    ) -> None:
+        self.methods = methods
+        self.operations = operations
+        self.key_headers = tuple(key_headers)
+        self._in_flight: Dict[Hashable, "asyncio.Future[Optional[Response]]"] = {}
+        self._in_flight_sync: Dict[Hashable, _SyncCall] = {}
+        self._lock = threading.Lock()
+
+    def get_key(self, request: Request) -> Optional[Tuple[Any, ...]]:
+        """
+        Returns the key identifying identical requests, or None if the request shouldn't be coalesced
+        """
+        if request.method not in self.methods:
+            return None
+        if self.operations is not None and get_operation_id(request) not in self.operations:
+            return None
+        header_values = tuple(request.headers.get(name) for name in self.key_headers)
+        return request.method, str(request.url), header_values
+
+    async def __call__(self, request: Request, call_next: Send) -> Response:
+        key = self.get_key(request)
+        if key is None:
+            return await call_next(request)
+        key = (asyncio.get_running_loop(), key)
+
+        in_flight = self._in_flight.get(key)
+        if in_flight is not None:
+            response = await asyncio.shield(in_flight)
+            if response is None:
+                return await call_next(request)
+            return response
+
+        future: "asyncio.Future[Optional[Response]]" = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        try:
+            response = await call_next(request)
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # the exception is raised here; don't warn if there are no followers
+            raise
+        except BaseException:
+            future.set_result(None)  # e.g. the leader was cancelled; followers send their own requests
+            raise
+        else:
+            future.set_result(self._share(response))
+        finally:
+            del self._in_flight[key]
+        return response
+
+    def call_sync(self, request: Request, call_next: SendSync) -> Response:
+        key = self.get_key(request)
+        if key is None:
+            return call_next(request)
+
+        with self._lock:
+            call = self._in_flight_sync.get(key)
+            is_leader = call is None
+            if call is None:
+                call = self._in_flight_sync[key] = _SyncCall()
+
+        if not is_leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            if call.response is None:
+                return call_next(request)
+            return call.response
+
+        try:
+            response = call_next(request)
+            call.response = self._share(response)
+            return response
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._in_flight_sync[key]
+            call.done.set()
+
+    @staticmethod
+    def _share(response: Response) -> Optional[Response]:
+        """
+        Prepares the response to be handed to followers; returns None if it can't be shared
+        """
+        try:
+            response.content
+        except ResponseNotRead:
+            return None
+        response.extensions.setdefault(PARSED_RESULTS, {})
+        return response
@@ -0,0 +1,125 @@
+"""
+Token stores, so tokens obtained by one client (or process) can be reused by others instead of logging in again.
+
+Tokens are stored under a key derived from the credentials they were obtained with (username, token URL and scope,
+see `get_token_key`), so clients with different credentials sharing a store don't use each other's tokens.
+
+`FileTokenStore` keeps the tokens in a JSON file: writes go to a temporary file that atomically replaces the
+previous one, and reads and writes are serialized across processes with a lock file (on platforms with `fcntl`).
+"""
+import hashlib
+import json
+import os
+import tempfile
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Dict, Iterator, Optional
+
+from pydantic import BaseModel, ValidationError
+
+try:
+    import fcntl
+except ImportError:  # e.g. Windows; the atomic replace still keeps readers from seeing partial writes
+    fcntl = None  # type: ignore
+
+
+class StoredTokens(BaseModel):
+    access_token: str
+    refresh_token: Optional[str]
+    expires_at: Optional[datetime]  # should be UTC
+    scope: Optional[str]
+    issued_at: Optional[datetime]  # UTC; tells which of two clients' tokens are newer
+
+
+def get_token_key(username: Optional[str], token_url: str, scope: Optional[str]) -> str:
+    """
+    Returns the key tokens obtained with these credentials are stored under (a hash, so usernames aren't stored)
+    """
+    identity = json.dumps([username, token_url, scope])
+    return hashlib.sha256(identity.encode("utf-8")).hexdigest()
+
+
+class TokenStore:
+    """
+    Base class for token stores; `load` returns None if no tokens are stored under the key
+    """
+
+    def load(self, key: str) -> Optional[StoredTokens]:
+        raise NotImplementedError
+
+    def save(self, key: str, tokens: StoredTokens) -> None:
+        raise NotImplementedError
+
+
+class MemoryTokenStore(TokenStore):
+    """
+    Shares tokens between the clients (and threads) of one process
+    """
+
+    def __init__(self) -> None:
+        self.tokens: Dict[str, StoredTokens] = {}
+
+    def load(self, key: str) -> Optional[StoredTokens]:
+        return self.tokens.get(key)
+
+    def save(self, key: str, tokens: StoredTokens) -> None:
+        self.tokens[key] = tokens
+
+
+class FileTokenStore(TokenStore):
+    """
+    Shares tokens between processes through the file at `path` (created with owner-only permissions)
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.lock_path = path + ".lock"
+
+    def load(self, key: str) -> Optional[StoredTokens]:
+        with self._locked(shared=True):
+            entry = self._read_entries().get(key)
+        if entry is None:
+            return None
+        try:
+            return StoredTokens.parse_obj(entry)
+        except ValidationError:
+            return None
+
+    def save(self, key: str, tokens: StoredTokens) -> None:
+        directory = os.path.dirname(os.path.abspath(self.path))
+        with self._locked(shared=False):
+            entries = self._read_entries()
+            entries[key] = json.loads(tokens.json())
+            fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".tokens-")
+            try:
+                with os.fdopen(fd, "w") as file:
+                    file.write(json.dumps(entries))
+                    file.flush()
+                    os.fsync(file.fileno())
+                os.replace(temp_path, self.path)
+            except BaseException:
+                os.unlink(temp_path)
+                raise
+
+    def _read_entries(self) -> Dict[str, Any]:
+        """
+        Returns the stored tokens by key (none if the file is missing or invalid)
+        """
+        try:
+            with open(self.path, "rb") as file:
+                entries = json.loads(file.read())
+        except (FileNotFoundError, ValueError):
+            return {}
+        return entries if isinstance(entries, dict) else {}
+
+    @contextmanager
+    def _locked(self, *, shared: bool) -> Iterator[None]:
+        if fcntl is None:
+            yield
+            return
+        fd = os.open(self.lock_path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+            yield
+        finally:
+            os.close(fd)  # closing the file releases the lock
@@ -0,0 +1,108 @@
+"""
+Timing of the stages of each call, for attributing client time:
+
+* `build`: building the request's path parameters, query and headers from the operation's arguments
+* `encode`: serializing the request body and assembling the `httpx.Request`
+* `send`: the middleware chain and the network round trip
+* `decode`: decoding the JSON response body
+* `validate`: parsing the decoded response into models
+
+Set `ApiClient.tracer` to a `StageTracer` to receive the stages; with no tracer set, stages cost a no-op `with`.
+Streamed calls report `build`, `encode` and `send` only; `build` is reported by the generated api methods, so
+requests made with `ApiClient.request` directly start at `encode`.
+"""
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+
+BUILD = "build"
+ENCODE = "encode"
+SEND = "send"
+DECODE = "decode"
+VALIDATE = "validate"
+
+
+class StageTracer:
+    """
+    Base class for tracers: `start` is called when a stage begins and returns a token, which is passed to `end`
+    (with the exception, if the stage raised one) when the stage ends.
+    """
+
+    def start(self, stage: str, operation_id: Optional[str]) -> Any:
+        return None
+
+    def end(self, token: Any, error: Optional[BaseException] = None) -> None:
+        pass
+
+
+class TracedStage:
+    __slots__ = ("tracer", "stage", "operation_id", "token")
+
+    def __init__(self, tracer: StageTracer, stage: str, operation_id: Optional[str]) -> None:
+        self.tracer = tracer
+        self.stage = stage
+        self.operation_id = operation_id
+
+    def __enter__(self) -> None:
+        self.token = self.tracer.start(self.stage, self.operation_id)
+
+    def __exit__(self, exc_type: Any, exc_value: Optional[BaseException], traceback: Any) -> None:
+        self.tracer.end(self.token, exc_value)
+
+
+class StageTimer(StageTracer):
+    """
+    Adds up the time spent in each stage, per operation
+    """
+
+    def __init__(self) -> None:
+        self.totals: Dict[Tuple[Optional[str], str], float] = {}
+        self.counts: Dict[Tuple[Optional[str], str], int] = {}
+        self._lock = threading.Lock()
+
+    def start(self, stage: str, operation_id: Optional[str]) -> Any:
+        return operation_id, stage, time.perf_counter()
+
+    def end(self, token: Any, error: Optional[BaseException] = None) -> None:
+        operation_id, stage, start = token
+        elapsed = time.perf_counter() - start
+        key = (operation_id, stage)
+        with self._lock:
+            self.totals[key] = self.totals.get(key, 0.0) + elapsed
+            self.counts[key] = self.counts.get(key, 0) + 1
+
+    def summary(self) -> Dict[Optional[str], Dict[str, float]]:
+        """
+        Returns the mean seconds spent in each stage, by operation id
+        """
+        summary: Dict[Optional[str], Dict[str, float]] = {}
+        with self._lock:
+            for (operation_id, stage), total in self.totals.items():
+                summary.setdefault(operation_id, {})[stage] = total / self.counts[(operation_id, stage)]
+        return summary
+
+
+class OpenTelemetryTracer(StageTracer):
+    """
+    Records each stage as an OpenTelemetry span named "<operation id> <stage>".
+
+    Requires the `opentelemetry-api` package; spans become children of the span that is current when the call is made.
+    """
+
+    def __init__(self, tracer: Any = None) -> None:
+        if tracer is None:
+            from opentelemetry import trace
+
+            tracer = trace.get_tracer(__name__)
+        self.tracer = tracer
+
+    def start(self, stage: str, operation_id: Optional[str]) -> Any:
+        attributes = {"api.stage": stage}
+        if operation_id is not None:
+            attributes["api.operation_id"] = operation_id
+        return self.tracer.start_span(f"{operation_id or 'request'} {stage}", attributes=attributes)
+
+    def end(self, token: Any, error: Optional[BaseException] = None) -> None:
+        if error is not None:
+            token.record_exception(error)
+        token.end()
@@ -0,0 +1,270 @@
+"""
+Streaming multipart uploads.
+
+Request bodies with files are encoded by `MultipartEncoder`, which reads the files in `chunk_size` chunks while the
+request is sent, so uploads never sit in memory whole:
+
+* `Content-Length` is computed up front when the size of every file is known (bytes, memory-mapped files, regular
+  files and other seekable files); otherwise the body is sent with chunked transfer encoding
+* files are read from their position when the request was built, so the body can be sent again (e.g. by the retry
+  and auth middleware) by seeking back; bodies with unseekable files can only be sent once
+* `MappedFile` memory-maps a file, so its chunks are sent straight from the page cache without being copied
+* the async apis read files (sources with a file descriptor) on a worker thread, so reads don't block the event
+  loop; in-memory sources (bytes, memory-mapped files, `BytesIO`) are chunked on the loop
+* a progress callback is called with the bytes sent so far and the total (None if unknown) after each chunk
+"""
+import asyncio
+import mimetypes
+import mmap
+import os
+import stat
+import uuid
+from typing import IO, Any, AsyncIterator, Callable, Dict, Iterator, List, Mapping, Optional, Tuple, Union
+
+from httpx import AsyncByteStream, StreamConsumed, SyncByteStream
+
+DEFAULT_CHUNK_SIZE = 64 * 1024
+
+ProgressCallback = Callable[[int, Optional[int]], None]
+Source = Union[bytes, memoryview, IO[Any], "MappedFile"]
+
+
+class MappedFile:
+    """
+    A file memory-mapped for reading, to be passed as an upload instead of an open file (`name` is the filename sent)
+    """
+
+    def __init__(self, path: str, name: str = None) -> None:
+        self.name = name if name is not None else os.path.basename(path)
+        with open(path, "rb") as file:
+            size = os.fstat(file.fileno()).st_size
+            self._map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) if size else None
+        self.size = size
+
+    def view(self, start: int, end: int) -> memoryview:
+        if self._map is None:
+            return memoryview(b"")
+        return memoryview(self._map)[start:end]
+
+    def read(self, size: int = -1) -> bytes:
+        return self._map.read(size) if self._map is not None else b""
+
+    def seek(self, offset: int, whence: int = os.SEEK_SET) -> int:
+        if self._map is not None:
+            self._map.seek(offset, whence)  # type: ignore
+        return self.tell()
+
+    def tell(self) -> int:
+        return self._map.tell() if self._map is not None else 0
+
+    def close(self) -> None:
+        if self._map is not None:
+            self._map.close()
+
+    def __enter__(self) -> "MappedFile":
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self.close()
+
+
+class _Part:
+    __slots__ = ("headers", "source", "start", "length", "blocking")
+
+    def __init__(self, headers: bytes, source: Source) -> None:
+        self.headers = headers
+        self.source = source
+        self.start = 0
+        self.length: Optional[int] = None
+        self.blocking = False  # True if reading the source blocks (it's a file)
+        if isinstance(source, (bytes, memoryview)):
+            self.length = len(source)
+        elif isinstance(source, MappedFile):
+            self.start = source.tell()
+            self.length = source.size - self.start
+        else:
+            self.start, self.length = _get_position_and_length(source)
+            self.blocking = _has_file_descriptor(source)
+
+    @property
+    def seekable(self) -> bool:
+        return isinstance(self.source, (bytes, memoryview, MappedFile)) or self.start >= 0
+
+    def chunks(self, chunk_size: int) -> Iterator[bytes]:
+        source = self.source
+        if isinstance(source, (bytes, memoryview)):
+            view = memoryview(source)
+            for start in range(0, len(view), chunk_size):
+                yield view[start : start + chunk_size]  # type: ignore
+            return
+        if isinstance(source, MappedFile):
+            end = source.size
+            for start in range(self.start, end, chunk_size):
+                yield source.view(start, min(start + chunk_size, end))  # type: ignore
+            return
+        if self.start >= 0:
+            source.seek(self.start)
+        while True:
+            chunk = source.read(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+
+class MultipartEncoder(SyncByteStream, AsyncByteStream):
+    """
+    Encodes `data` (form fields) and `files` (sources by field name; a source can also be a `(filename, source)` or
+    `(filename, source, content type)` tuple) as a streamed `multipart/form-data` body
+    """
+
+    def __init__(
+        self,
+        data: Optional[Mapping[str, Any]],
+        files: Mapping[str, Any],
+        *,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        progress: ProgressCallback = None,
+        boundary: str = None,
+    ) -> None:
+        self.boundary = (boundary or uuid.uuid4().hex).encode("ascii")
+        self.chunk_size = chunk_size
+        self.progress = progress
+        self.parts: List[_Part] = []
+        for name, value in (data or {}).items():
+            for item in value if isinstance(value, (list, tuple)) else [value]:
+                self.parts.append(_Part(self._render_headers(name, None, None), _to_bytes(item)))
+        for name, value in files.items():
+            filename, source, content_type = _unpack_file(value)
+            self.parts.append(_Part(self._render_headers(name, filename, content_type), source))
+        self.content_length = self._get_content_length()
+        self.replayable = all(part.seekable for part in self.parts)
+        self._consumed = False
+
+    def get_headers(self) -> Dict[str, str]:
+        headers = {"Content-Type": f"multipart/form-data; boundary={self.boundary.decode('ascii')}"}
+        if self.content_length is None:
+            headers["Transfer-Encoding"] = "chunked"
+        else:
+            headers["Content-Length"] = str(self.content_length)
+        return headers
+
+    def __iter__(self) -> Iterator[bytes]:
+        self._start()
+        sent = 0
+        for chunk in self._iter_chunks():
+            yield chunk
+            sent += len(chunk)
+            self._report(sent)
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        self._start()
+        loop = asyncio.get_running_loop()
+        sent = 0
+        for chunks, blocking in self._iter_sections():
+            while True:
+                chunk = await loop.run_in_executor(None, next, chunks, None) if blocking else next(chunks, None)
+                if chunk is None:
+                    break
+                yield chunk
+                sent += len(chunk)
+                self._report(sent)
+
+    def _start(self) -> None:
+        if self._consumed and not self.replayable:
+            raise StreamConsumed()
+        self._consumed = True
+
+    def _report(self, sent: int) -> None:
+        if self.progress is not None:
+            self.progress(sent, self.content_length)
+
+    def _iter_chunks(self) -> Iterator[bytes]:
+        for chunks, _ in self._iter_sections():
+            yield from chunks
+
+    def _iter_sections(self) -> Iterator[Tuple[Iterator[bytes], bool]]:
+        """
+        Yields the chunks of each section of the body, and whether reading them blocks (they're read from a file)
+        """
+        for part in self.parts:
+            yield iter((b"--" + self.boundary + b"\r\n" + part.headers,)), False
+            yield part.chunks(self.chunk_size), part.blocking
+            yield iter((b"\r\n",)), False
+        yield iter((b"--" + self.boundary + b"--\r\n",)), False
+
+    def _get_content_length(self) -> Optional[int]:
+        length = len(self.boundary) + 6  # the closing boundary
+        for part in self.parts:
+            if part.length is None:
+                return None
+            length += len(self.boundary) + 4 + len(part.headers) + part.length + 2
+        return length
+
+    @staticmethod
+    def _render_headers(name: str, filename: Optional[str], content_type: Optional[str]) -> bytes:
+        headers = f'Content-Disposition: form-data; name="{_quote(name)}"'
+        if filename is not None:
+            headers += f'; filename="{_quote(filename)}"'
+        if content_type is not None:
+            headers += f"\r\nContent-Type: {content_type}"
+        return headers.encode("utf-8") + b"\r\n\r\n"
+
+
+def _unpack_file(value: Any) -> Tuple[str, Source, str]:
+    content_type = None
+    if isinstance(value, tuple):
+        filename, source, *rest = value
+        content_type = rest[0] if rest else None
+    else:
+        filename, source = os.path.basename(str(getattr(value, "name", "upload"))), value
+    if isinstance(source, str):
+        source = source.encode("utf-8")
+    if content_type is None:
+        content_type = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+    return filename, source, content_type
+
+
+def _get_position_and_length(file: IO[Any]) -> Tuple[int, Optional[int]]:
+    """
+    Returns the file's current position and the length of its remaining content; the position is -1 for unseekable
+    files, and the length None if unknown
+    """
+    try:
+        position = file.tell()
+    except (AttributeError, OSError):
+        return -1, None
+    try:
+        stat_result = os.fstat(file.fileno())
+    except (AttributeError, OSError, ValueError):  # e.g. BytesIO, which has no file descriptor
+        stat_result = None
+    if stat_result is not None and stat.S_ISREG(stat_result.st_mode):
+        size = stat_result.st_size
+    else:
+        try:
+            size = file.seek(0, os.SEEK_END)
+            file.seek(position)
+        except (AttributeError, OSError):
+            return -1, None
+    return position, max(size - position, 0)
+
+
+def _has_file_descriptor(file: IO[Any]) -> bool:
+    try:
+        file.fileno()
+    except (AttributeError, OSError, ValueError):  # e.g. BytesIO
+        return False
+    return True
+
+
+def _to_bytes(value: Any) -> bytes:
+    if isinstance(value, bytes):
+        return value
+    if value is None:
+        return b""
+    if isinstance(value, bool):
+        return b"true" if value else b"false"
+    return str(value).encode("utf-8")
+
+
+def _quote(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', "%22").replace("\r", "%0D").replace("\n", "%0A")
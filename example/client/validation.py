@@ -0,0 +1,154 @@
+"""
+Response validation policies, for trading validation for speed with trusted servers.
+
+* `full`: responses are parsed and validated by pydantic (the default)
+* `construct`: models are built from the response without validation (nested models, lists and dicts of models
+  included), so values keep their JSON types (e.g. datetimes stay strings)
+* `sampled`: one in `sample_rate` responses is validated, the rest are constructed, to catch schema drift
+
+Constructors are compiled once per type from the models' fields, like the parsers used for validation.
+"""
+import itertools
+import threading
+from copy import deepcopy
+from typing import Any, Callable, Dict, List, Optional, Tuple, Type, Union
+
+from pydantic import BaseModel
+from pydantic.fields import SHAPE_DICT, SHAPE_LIST, SHAPE_MAPPING, SHAPE_SINGLETON, ModelField
+
+FULL = "full"
+CONSTRUCT = "construct"
+SAMPLED = "sampled"
+
+Constructor = Callable[[Any], Any]
+
+_REQUIRED: Any = object()
+
+
+class ValidationPolicy:
+    def __init__(self, mode: str = FULL, sample_rate: int = 100) -> None:
+        if mode not in (FULL, CONSTRUCT, SAMPLED):
+            raise ValueError(f"Unknown validation mode {mode!r}, expected one of {[FULL, CONSTRUCT, SAMPLED]}")
+        self.mode = mode
+        self.sample_rate = sample_rate
+        self._responses = itertools.count()
+
+    def should_validate(self) -> bool:
+        if self.mode == FULL:
+            return True
+        if self.mode == CONSTRUCT:
+            return False
+        return next(self._responses) % self.sample_rate == 0
+
+
+_constructors: Dict[Any, Constructor] = {}
+# the constructors being built (by the thread holding `_lock`), published to `_constructors` once all are built
+_building: Dict[Any, Constructor] = {}
+_lock = threading.RLock()
+
+
+def get_constructor(type_: Any) -> Constructor:
+    """
+    Returns a function building a (decoded) response of type `type_` without validating it
+    """
+    try:
+        return _constructors[type_]
+    except KeyError:
+        pass
+    with _lock:
+        constructor = _constructors.get(type_) or _building.get(type_)
+        if constructor is not None:
+            return constructor
+        outermost = not _building
+        _building[type_] = lambda data: _constructors[type_](data)  # for models referencing themselves
+        try:
+            constructor = _building[type_] = _build_constructor(type_)
+            if outermost:
+                _constructors.update(_building)
+        finally:
+            if outermost:
+                _building.clear()
+        return constructor
+
+
+def _build_constructor(type_: Any) -> Constructor:
+    if isinstance(type_, type) and issubclass(type_, BaseModel):
+        return _build_model_constructor(type_)
+    origin = getattr(type_, "__origin__", None)
+    args = [arg for arg in getattr(type_, "__args__", None) or () if arg is not type(None)]  # noqa E721
+    if origin is Union:
+        return _construct_optional(get_constructor(args[0])) if len(args) == 1 else _construct_as_is
+    if origin is list and args:
+        return _construct_list(get_constructor(args[0]))
+    if origin is dict and len(args) == 2:
+        return _construct_dict(get_constructor(args[1]))
+    return _construct_as_is
+
+
+def _get_field_constructor(field: ModelField) -> Constructor:
+    """
+    Returns the constructor for a model field, from pydantic's analysis of its type (forward references resolved)
+    """
+    if field.shape == SHAPE_SINGLETON:
+        return _construct_as_is if field.sub_fields else get_constructor(field.type_)  # unions are kept as decoded
+    if field.shape == SHAPE_LIST and field.sub_fields:
+        return _construct_list(_get_field_constructor(field.sub_fields[0]))
+    if field.shape in (SHAPE_DICT, SHAPE_MAPPING) and field.sub_fields:
+        return _construct_dict(_get_field_constructor(field.sub_fields[0]))
+    return _construct_as_is
+
+
+def _build_model_constructor(model: Type[BaseModel]) -> Constructor:
+    fields: List[Tuple[str, str, Optional[Constructor], Any, bool]] = []
+    for name, field in model.__fields__.items():
+        constructor: Optional[Constructor] = _get_field_constructor(field)
+        default = _REQUIRED if field.required else field.default
+        if constructor is _construct_as_is:
+            constructor = None
+        fields.append((name, field.alias, constructor, default, isinstance(default, (list, dict, set))))
+    has_private_attributes = bool(getattr(model, "__private_attributes__", None))
+    new = object.__new__
+    set_attribute = object.__setattr__
+
+    def construct(data: Any) -> Any:
+        if not isinstance(data, dict):
+            return data
+        values = {}
+        fields_set = set()
+        for name, alias, constructor, default, copy_default in fields:
+            if alias in data:
+                value = data[alias]
+                values[name] = value if constructor is None or value is None else constructor(value)
+                fields_set.add(name)
+            elif default is not _REQUIRED:
+                values[name] = deepcopy(default) if copy_default else default
+        instance = new(model)
+        set_attribute(instance, "__dict__", values)
+        set_attribute(instance, "__fields_set__", fields_set)
+        if has_private_attributes:
+            instance._init_private_attributes()
+        return instance
+
+    return construct
+
+
+def _construct_as_is(data: Any) -> Any:
+    return data
+
+
+def _construct_optional(construct: Constructor) -> Constructor:
+    if construct is _construct_as_is:
+        return _construct_as_is
+    return lambda data: None if data is None else construct(data)
+
+
+def _construct_list(construct: Constructor) -> Constructor:
+    if construct is _construct_as_is:
+        return _construct_as_is
+    return lambda data: [construct(item) for item in data] if isinstance(data, list) else data
+
+
+def _construct_dict(construct: Constructor) -> Constructor:
+    if construct is _construct_as_is:
+        return _construct_as_is
+    return lambda data: {key: construct(value) for key, value in data.items()} if isinstance(data, dict) else data
@@ -19,7 +19,7 @@ class AutoAuthClient(ApiClient):
         super().__init__(host)
         self.auth_state = AuthState()
         flow = OAuthFlowPassword(tokenUrl=tokenUrl)
-        auth_middleware = AuthMiddleware(auth_state=self.auth_state, flow=flow)
+        auth_middleware = AuthMiddleware(auth_state=self.auth_state, flow=flow, client=self)
         self.add_middleware(auth_middleware)
 
     def set_creds(self, username: str, password: str) -> None:
@@ -19,13 +19,15 @@ WORK_DIR=""
 TEMP_DIR=""
 WITH_META=""
 MAP_LOCALHOST=""
+SPLIT_MODELS=""
 
 usage() {
   exitcode="$1"
   cat <<USAGE >&2
 
 Usage:
-  $CMDNAME -i INPUT -p PACKAGE_NAME -o OUTPUT_PATH [-n IMPORT_NAME] [--include-auth] -- [*openapi-generator-cli args]
+  $CMDNAME -i INPUT -p PACKAGE_NAME -o OUTPUT_PATH [-n IMPORT_NAME] [--include-auth] [--split-models]
+    -- [*openapi-generator-cli args]
 
 Options:
   -i, --input              The location of the OpenAPI spec, as URL or file
@@ -35,6 +37,7 @@ Options:
   -t, --temp-dir           The location for temporary files
   -m, --map-localhost      (OSX): Map localhost / 127.0.0.1 to host.docker.internal
   --with-meta              Generate meta-data (setup.py, docs, tests)
+  --split-models           Generate one module per model (schema), imported when the model is first used
   -h, --help               Show this message
 USAGE
   exit "$exitcode"
@@ -50,12 +53,13 @@ main() {
 
   cd "${PROJECT_ROOT}"
 
+  add_support_files "$WORK_DIR"
   if [ -n "$INCLUDE_AUTH" ]; then
     add_auth_files "$WORK_DIR"
   fi
   fill_import_name_templates "$WORK_DIR"
 
-  ./scripts/util/postprocess.sh -p "${PACKAGE_NAME}" -w "$WORK_DIR"
+  ./scripts/util/postprocess.sh -p "${PACKAGE_NAME}" -w "$WORK_DIR" ${SPLIT_MODELS:+--split-models}
   clean_openapi_generator_output "$WORK_DIR"
   move_generated_output "$WORK_DIR"
   echo "Generation succeeded 🚀"
@@ -102,10 +106,31 @@ setup_openapi_generation() {
   rm "$WORK_DIR"/.openapi-generator-ignore.bak
 }
 
+add_support_files() {
+  WORK_DIR=$1
+  add_extra_python_template "$WORK_DIR" batch
+  add_extra_python_template "$WORK_DIR" serialization
+  add_extra_python_template "$WORK_DIR" cache
+  add_extra_python_template "$WORK_DIR" cassette
+  add_extra_python_template "$WORK_DIR" circuit_breaker
+  add_extra_python_template "$WORK_DIR" compression
+  add_extra_python_template "$WORK_DIR" download
+  add_extra_python_template "$WORK_DIR" metrics
+  add_extra_python_template "$WORK_DIR" pagination
+  add_extra_python_template "$WORK_DIR" pool
+  add_extra_python_template "$WORK_DIR" rate_limit
+  add_extra_python_template "$WORK_DIR" retry
+  add_extra_python_template "$WORK_DIR" single_flight
+  add_extra_python_template "$WORK_DIR" tracing
+  add_extra_python_template "$WORK_DIR" upload
+  add_extra_python_template "$WORK_DIR" validation
+}
+
 add_auth_files() {
   WORK_DIR=$1
   add_extra_python_template "$WORK_DIR" auth
   add_extra_python_template "$WORK_DIR" password_flow_client
+  add_extra_python_template "$WORK_DIR" token_store
 }
 
 fill_import_name_templates() {
@@ -113,6 +138,7 @@ fill_import_name_templates() {
   PACKAGE_DIR="$WORK_DIR"/"$PACKAGE_NAME"
   fill_import_name_template "$PACKAGE_DIR"/api_client.py
   fill_import_name_template "$PACKAGE_DIR"/__init__.py
+  fill_import_name_template "$PACKAGE_DIR"/models/__init__.py
 
   pushd "${PACKAGE_DIR}/api"
   find . -name "*.py" | while read -r filename; do
@@ -195,6 +221,10 @@ while [ $# -gt 0 ]; do
     WITH_META="yes"
     shift 1
     ;;
+  --split-models)
+    SPLIT_MODELS="yes"
+    shift 1
+    ;;
   --)
     shift 1
     break
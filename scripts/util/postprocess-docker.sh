@@ -5,6 +5,8 @@ cd /generator-output
 
 CMDNAME=${0##*/}
 
+SPLIT_MODELS=""
+
 usage() {
   exitcode="$1"
   cat <<USAGE >&2
@@ -12,10 +14,11 @@ usage() {
 Postprocess the output of openapi-generator
 
 Usage:
-  $CMDNAME -p PACKAGE_NAME
+  $CMDNAME -p PACKAGE_NAME [--split-models]
 
 Options:
   -p, --package-name       The name to use for the generated package
+  --split-models           Keep the models in one module per schema, loaded lazily
   -h, --help               Show this message
 USAGE
   exit "$exitcode"
@@ -23,7 +26,9 @@ USAGE
 
 main() {
   validate_inputs
-  merge_generated_models
+  if [ -z "$SPLIT_MODELS" ]; then
+    merge_generated_models
+  fi
   delete_unused
   fix_any_of
   apply_formatters
@@ -70,6 +75,10 @@ while [ $# -gt 0 ]; do
     PACKAGE_NAME=$2
     shift 2
     ;;
+  --split-models)
+    SPLIT_MODELS="yes"
+    shift 1
+    ;;
   -h | --help)
     usage 0
     ;;
@@ -8,6 +8,7 @@ CMDNAME=${0##*/}
 
 PACKAGE_NAME=""
 WORK_DIR=""
+SPLIT_MODELS=""
 
 usage() {
   exitcode="$1"
@@ -16,11 +17,12 @@ usage() {
 Use docker to postprocess the output of openapi-generator
 
 Usage:
-  $CMDNAME -p PACKAGE_NAME
+  $CMDNAME -p PACKAGE_NAME [--split-models]
 
 Options:
   -p, --package-name       The name to use for the generated package
   -w, --work-dir           The working directory used for generator output
+  --split-models           Keep the models in one module per schema, loaded lazily
   -h, --help               Show this message
 USAGE
   exit "$exitcode"
@@ -29,7 +31,7 @@ USAGE
 main() {
   validate_inputs
   docker build -t fastapi-client-generator:latest .
-  docker run --rm --user $(id -u):$(id -g) -v "$WORK_DIR":/generator-output fastapi-client-generator:latest -p "${PACKAGE_NAME}"
+  docker run --rm --user $(id -u):$(id -g) -v "$WORK_DIR":/generator-output fastapi-client-generator:latest -p "${PACKAGE_NAME}" ${SPLIT_MODELS:+--split-models}
   add_py_typed
 }
 
@@ -59,6 +61,10 @@ while [ $# -gt 0 ]; do
     WORK_DIR=$2
     shift 2
     ;;
+  --split-models)
+    SPLIT_MODELS="yes"
+    shift 1
+    ;;
   -h | --help)
     usage 0
     ;;
@@ -26,6 +26,7 @@ os.makedirs(LOG_DIR, exist_ok=True)
 
 CLIENT_NAME = "generated_client"
 CLIENT_DIR = os.path.join(ROOT, CLIENT_NAME)
+SPLIT_CLIENT_NAME = "generated_client_split"
 
 
 def run_server(app: FastAPI, host: str, port: int, log_level: str, log_dir: str) -> None:
@@ -45,20 +46,21 @@ PROC = Process(
 )
 
 
-def create_generated_client() -> None:
+def create_generated_client(client_name: str = CLIENT_NAME, *options: str) -> None:
     """
     Invoke scripts/generate.sh to rebuild the test client from the running server app
     """
-    print("Generating client")
+    print("Generating client {}".format(client_name))
 
-    delete_generated_client()
+    delete_generated_client(client_name)
     args = [
         "{}/../scripts/generate.sh".format(ROOT),
         "-i",
         "http://localhost:8000/openapi.json",
         "-p",
-        CLIENT_NAME,
+        client_name,
         "--include-auth",
+        *options,
         "-o",
         ROOT,
         "-t",
@@ -68,29 +70,31 @@ def create_generated_client() -> None:
 
     process_result = subprocess.run(args, capture_output=True)
 
-    with open(os.path.join(LOG_DIR, "generation.log"), "wb") as file:
+    with open(os.path.join(LOG_DIR, "generation-{}.log".format(client_name)), "wb") as file:
         file.write(process_result.stdout)
 
-    with open(os.path.join(LOG_DIR, "generation.err"), "wb") as file:
+    with open(os.path.join(LOG_DIR, "generation-{}.err".format(client_name)), "wb") as file:
         file.write(process_result.stderr)
 
     if process_result.returncode != 0:  # pragma: no cover
         if process_result.stderr:
             sys.stderr.write(process_result.stderr.decode("utf-8"))
         pytest.exit(
-            "Failed to generate client api, code {}"
-            "\nLogs are in logs/generation.log and logs/generation.err".format(process_result.returncode),
+            "Failed to generate client api, code {0}"
+            "\nLogs are in logs/generation-{1}.log and logs/generation-{1}.err".format(
+                process_result.returncode, client_name
+            ),
             returncode=process_result.returncode,
         )
 
-    print("Client created in {}, logs in logs/generation.log\n".format(CLIENT_DIR))
+    print("Client created in {}, logs in logs/generation-{}.log\n".format(os.path.join(ROOT, client_name), client_name))
 
 
-def delete_generated_client() -> None:
+def delete_generated_client(client_name: str = CLIENT_NAME) -> None:
     """
     Delete the generated client
     """
-    shutil.rmtree(CLIENT_DIR, ignore_errors=True)
+    shutil.rmtree(os.path.join(ROOT, client_name), ignore_errors=True)
 
 
 def pytest_configure() -> None:  # pragma: no cover
@@ -106,6 +110,7 @@ def pytest_configure() -> None:  # pragma: no cover
         return
 
     create_generated_client()
+    create_generated_client(SPLIT_CLIENT_NAME, "--split-models")
 
 
 def pytest_unconfigure() -> None:  # pragma: no cover
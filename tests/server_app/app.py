@@ -6,9 +6,11 @@ import uvicorn
 from fastapi import FastAPI
 from fastapi.routing import APIRoute
 
+from .middleware import ContentEncodingMiddleware
 from .routers import auth_router, client_router
 
 app = FastAPI(debug=True)
+app.add_middleware(ContentEncodingMiddleware)
 
 
 @app.on_event("startup")
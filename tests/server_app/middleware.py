@@ -0,0 +1,127 @@
+"""
+Content-encoding middleware for the test server: decompresses request bodies, and compresses responses with the
+client's preferred encoding, for testing the client's compression middleware.
+
+zstd and br are supported if the `zstandard` and `brotli` packages are installed.
+"""
+
+import gzip
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+try:
+    import zstandard
+except ImportError:
+    zstandard = None  # type: ignore
+
+Message = Dict[str, Any]
+Receive = Callable[[], Awaitable[Message]]
+Send = Callable[[Message], Awaitable[None]]
+ASGIApp = Callable[[Dict[str, Any], Receive, Send], Awaitable[None]]
+
+DECOMPRESSORS: Dict[str, Callable[[bytes], bytes]] = {"gzip": gzip.decompress}
+COMPRESSORS: Dict[str, Callable[[bytes], bytes]] = {"gzip": gzip.compress}
+if brotli is not None:
+    DECOMPRESSORS["br"] = brotli.decompress
+    COMPRESSORS = {"br": brotli.compress, **COMPRESSORS}
+if zstandard is not None:
+    DECOMPRESSORS["zstd"] = lambda data: zstandard.ZstdDecompressor().decompressobj().decompress(data)
+    COMPRESSORS = {"zstd": lambda data: zstandard.ZstdCompressor().compress(data), **COMPRESSORS}
+
+MINIMUM_SIZE = 1000
+
+
+class ContentEncodingMiddleware:
+    """
+    Decompresses request bodies with a supported Content-Encoding (responding 415 to other encodings), and compresses
+    responses of at least `MINIMUM_SIZE` bytes with the first of zstd, br and gzip the client accepts
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Dict[str, Any], receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        headers = dict(scope["headers"])
+        content_encoding = headers.get(b"content-encoding", b"").decode("latin-1").lower()
+        if content_encoding:
+            decompress = DECOMPRESSORS.get(content_encoding)
+            if decompress is None:
+                await send({"type": "http.response.start", "status": 415, "headers": []})
+                await send({"type": "http.response.body", "body": b""})
+                return
+            body = decompress(await _read_body(receive))
+            scope = dict(scope, headers=_replace_headers(scope["headers"], [(b"content-length", b"%d" % len(body))]))
+            receive = _replay_body(body)
+
+        accept_encoding = headers.get(b"accept-encoding", b"").decode("latin-1").lower()
+        accepted = [encoding.split(";")[0].strip() for encoding in accept_encoding.split(",")]
+        encoding = next((encoding for encoding in COMPRESSORS if encoding in accepted), None)
+        if encoding is None:
+            await self.app(scope, receive, send)
+        else:
+            await self.app(scope, receive, _compressing_send(send, encoding))
+
+
+async def _read_body(receive: Receive) -> bytes:
+    chunks = []
+    while True:
+        message = await receive()
+        chunks.append(message.get("body", b""))
+        if not message.get("more_body", False):
+            return b"".join(chunks)
+
+
+def _replay_body(body: bytes) -> Receive:
+    sent = False
+
+    async def receive() -> Message:
+        nonlocal sent
+        if sent:
+            return {"type": "http.disconnect"}
+        sent = True
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    return receive
+
+
+def _replace_headers(headers: List[Tuple[bytes, bytes]], replacements: List[Tuple[bytes, bytes]]) -> List[Any]:
+    names = {name for name, _ in replacements} | {b"content-encoding"}
+    return [(name, value) for name, value in headers if name.lower() not in names] + replacements
+
+
+def _compressing_send(send: Send, encoding: str) -> Send:
+    """
+    Compresses responses sent in a single body message (streamed responses are sent as is)
+    """
+    start: Optional[Message] = None
+
+    async def compressing_send(message: Message) -> None:
+        nonlocal start
+        if message["type"] == "http.response.start":
+            start = message
+            return
+        if start is None:
+            await send(message)
+            return
+        response_start, start = start, None
+        body = message.get("body", b"")
+        already_encoded = any(name.lower() == b"content-encoding" for name, _ in response_start["headers"])
+        if message.get("more_body", False) or already_encoded or len(body) < MINIMUM_SIZE:
+            await send(response_start)
+            await send(message)
+            return
+        body = COMPRESSORS[encoding](body)
+        headers = _replace_headers(
+            response_start["headers"],
+            [(b"content-encoding", encoding.encode("ascii")), (b"content-length", b"%d" % len(body))],
+        )
+        await send(dict(response_start, headers=headers))
+        await send(dict(message, body=body))
+
+    return compressing_send
@@ -21,3 +21,17 @@ class ListTagsResponse(BaseModel):
     """Response from lists in query test"""
 
     tags: List[str]
+
+
+class ListItem(BaseModel):
+    """Item of the list streaming test"""
+
+    index: int
+    name: str
+
+
+class CursorPage(BaseModel):
+    """Page of the cursor pagination test"""
+
+    items: List[ListItem]
+    next_cursor: Optional[str] = None
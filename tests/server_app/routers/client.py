@@ -2,12 +2,13 @@
 Regression tests for fastapi_client
 """
 import hashlib
-from typing import Dict, List, Optional
+from typing import AsyncIterator, Dict, List, Optional
 
-from fastapi import APIRouter, File, Form, Query
+from fastapi import APIRouter, File, Form, Header, Query
 from starlette.requests import Request
+from starlette.responses import JSONResponse, Response, StreamingResponse
 
-from ..models import FormPostResponse, ListTagsResponse
+from ..models import CursorPage, FormPostResponse, ListItem, ListTagsResponse
 
 
 def client_router() -> APIRouter:
@@ -59,4 +60,87 @@ def client_router() -> APIRouter:
         """
         return ListTagsResponse(tags=tags)
 
+    @router.get("/list_items", response_model=List[ListItem])
+    async def list_items(count: int) -> List[ListItem]:
+        """
+        Responds with a JSON array of `count` items, for testing streamed list responses
+        """
+        return [ListItem(index=index, name=f"item {index}") for index in range(count)]
+
+    @router.get("/paged_items", response_model=List[ListItem], openapi_extra={"x-pagination": "offset"})
+    async def paged_items(
+        count: int, offset: int = 0, limit: int = 10, max_limit: Optional[int] = None
+    ) -> List[ListItem]:
+        """
+        Responds with the page of `limit` items (at most `max_limit`) from `offset` on, of `count` items, for testing
+        offset pagination
+        """
+        if max_limit is not None:
+            limit = min(limit, max_limit)
+        return [ListItem(index=index, name=f"item {index}") for index in range(offset, min(offset + limit, count))]
+
+    @router.get("/cursor_items", response_model=CursorPage, openapi_extra={"x-pagination": True})
+    async def cursor_items(count: int, cursor: Optional[str] = None, limit: int = 10) -> CursorPage:
+        """
+        Responds with the page of `limit` items after `cursor`, of `count` items, for testing cursor pagination
+        """
+        start = int(cursor) if cursor else 0
+        end = min(start + limit, count)
+        items = [ListItem(index=index, name=f"item {index}") for index in range(start, end)]
+        return CursorPage(items=items, next_cursor=str(end) if end < count else None)
+
+    @router.get(
+        "/binary_file",
+        response_class=StreamingResponse,
+        responses={200: {"content": {"application/octet-stream": {"schema": {"type": "string", "format": "binary"}}}}},
+    )
+    async def binary_file(size: int) -> StreamingResponse:
+        """
+        Responds with `size` bytes (repeating 0-255) in 64KiB chunks, for testing streamed downloads
+        """
+
+        async def chunks() -> AsyncIterator[bytes]:
+            pattern = bytes(range(256)) * 256
+            for start in range(0, size, len(pattern)):
+                yield pattern[: min(len(pattern), size - start)]
+
+        return StreamingResponse(chunks(), media_type="application/octet-stream")
+
+    @router.post("/echo_items", response_model=List[ListItem])
+    async def echo_items(items: List[ListItem]) -> List[ListItem]:
+        """
+        Responds with the items in the request body, for testing request and response compression
+        """
+        return items
+
+    @router.get("/raw_path/{value:path}")
+    async def raw_path(request: Request, value: str) -> Dict[str, str]:
+        """
+        Responds with the raw (still percent-encoded) path of the request, for checking path parameters are encoded
+        """
+        return {"raw_path": request.scope["raw_path"].decode("ascii"), "value": value}
+
+    @router.get("/etag_resource")
+    async def etag_resource(if_none_match: Optional[str] = Header(None)) -> Response:
+        """
+        Responds with an ETag and `Cache-Control: no-cache`, and with 304 Not Modified if the client's
+        If-None-Match header matches it
+        """
+        headers = {"ETag": '"v1"', "Cache-Control": "no-cache"}
+        if if_none_match == '"v1"':
+            return Response(status_code=304, headers=headers)
+        return JSONResponse(content={"hello": "cache"}, headers=headers)
+
+    flaky_attempts: Dict[str, int] = {}
+
+    @router.get("/flaky")
+    async def flaky(key: str, failures: int) -> Response:
+        """
+        Responds with 503 Service Unavailable (and `Retry-After: 0`) to the first `failures` requests for `key`
+        """
+        attempt = flaky_attempts[key] = flaky_attempts.get(key, 0) + 1
+        if attempt <= failures:
+            return Response(status_code=503, headers={"Retry-After": "0"})
+        return JSONResponse(content={"attempts": attempt})
+
     return router
@@ -1,8 +1,13 @@
-from typing import Dict
+from asyncio import gather, get_event_loop
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict
 
+from _pytest.monkeypatch import MonkeyPatch
 from fastapi.openapi.models import OAuthFlowPassword
 from generated_client.api_client import ApiClient
 from generated_client.auth import AuthMiddleware, AuthState
+from generated_client.token_store import FileTokenStore, TokenStore
 
 
 class AutoAuthClient(ApiClient):
@@ -10,12 +15,14 @@ class AutoAuthClient(ApiClient):
     Subclasses ApiClient to add some extra functionality
     """
 
-    def __init__(self, host: str = "http://localhost", tokenUrl: str = "http://localhost/token"):
+    def __init__(
+        self, host: str = "http://localhost", tokenUrl: str = "http://localhost/token", token_store: TokenStore = None
+    ):
         super().__init__(host)
         self.auth_state = AuthState()
         flow = OAuthFlowPassword(tokenUrl=tokenUrl)
-        auth_middleware = AuthMiddleware(auth_state=self.auth_state, flow=flow)
-        self.add_middleware(auth_middleware)
+        self.auth_middleware = AuthMiddleware(auth_state=self.auth_state, flow=flow, token_store=token_store)
+        self.add_middleware(self.auth_middleware)
 
     def set_creds(self, username: str, password: str) -> None:
         self.auth_state.username = username
@@ -28,3 +35,65 @@ def test_auth() -> None:
     result = client.request_sync(type_=Dict, method="GET", url="/")
     assert result == {"result": "success"}
     assert client.auth_state.access_token == "access_token"
+    assert client.auth_middleware.flow_client._sync_client is client._sync_client  # shares the client's pool
+
+
+def test_auth_concurrent_login(monkeypatch: MonkeyPatch) -> None:
+    """
+    Check concurrent requests rejected for lack of a token share a single login
+    """
+    client = AutoAuthClient(host="http://localhost:8000", tokenUrl="http://localhost:8000/token")
+    client.set_creds("username", "password")
+    flow_client = client.auth_middleware.flow_client
+    request_access_token = flow_client.request_access_token
+    logins = []
+
+    async def count_logins(access_token_request: Any) -> Any:
+        logins.append(access_token_request)
+        return await request_access_token(access_token_request)
+
+    monkeypatch.setattr(flow_client, "request_access_token", count_logins)
+    requests = gather(*[client.request(type_=Dict, method="GET", url="/") for _ in range(10)])
+    results = get_event_loop().run_until_complete(requests)
+    assert results == [{"result": "success"}] * 10
+    assert len(logins) == 1
+
+
+def test_auth_token_store(tmp_path: Path, monkeypatch: MonkeyPatch) -> None:
+    """
+    Check a client reuses the tokens another client with the same credentials saved to a file token store, instead
+    of logging in, that a client with other credentials doesn't, and that stored tokens only replace older ones
+    """
+    token_store = FileTokenStore(str(tmp_path / "tokens.json"))
+    client = AutoAuthClient(
+        host="http://localhost:8000", tokenUrl="http://localhost:8000/token", token_store=token_store
+    )
+    client.set_creds("username", "password")
+    assert client.request_sync(type_=Dict, method="GET", url="/") == {"result": "success"}
+
+    other_client = AutoAuthClient(
+        host="http://localhost:8000", tokenUrl="http://localhost:8000/token", token_store=token_store
+    )
+    other_client.set_creds("username", "password")
+
+    def fail_login(access_token_request: Any) -> Any:
+        raise AssertionError("logged in again")
+
+    monkeypatch.setattr(other_client.auth_middleware.flow_client, "request_access_token_sync", fail_login)
+    assert other_client.request_sync(type_=Dict, method="GET", url="/") == {"result": "success"}
+    assert other_client.auth_state.access_token == "access_token"
+
+    stranger = AutoAuthClient(
+        host="http://localhost:8000", tokenUrl="http://localhost:8000/token", token_store=token_store
+    )
+    stranger.set_creds("stranger", "password")
+    stranger.auth_middleware.load_stored_tokens()
+    assert stranger.auth_state.access_token is None
+
+    newer = other_client.auth_state.copy(update={"access_token": "newer", "issued_at": datetime.utcnow()})
+    other_client.auth_state.issued_at = newer.issued_at - timedelta(minutes=1)
+    token_store.save(other_client.auth_middleware.get_token_key(), newer.get_stored_tokens())
+    client.auth_state.issued_at = newer.issued_at + timedelta(minutes=1)
+    for auth_client, expected in [(client, "access_token"), (other_client, "newer")]:
+        auth_client.auth_middleware.load_stored_tokens()
+        assert auth_client.auth_state.access_token == expected  # only older tokens are replaced
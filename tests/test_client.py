@@ -3,12 +3,36 @@
 Regression tests
 """
 import hashlib
+import inspect
+import io
+import itertools
+import stat
+import sys
+import time
 from asyncio import get_event_loop
-from typing import Tuple, Type
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from pathlib import Path
+from typing import Any, List, Optional, Tuple, Type
 
 import generated_client.models as models
-from generated_client.api_client import ApiClient, SyncApis
+import generated_client_split.models as split_models
+import pytest
+from _pytest.monkeypatch import MonkeyPatch
+from generated_client import validation
+from generated_client.api_client import ApiClient, AsyncApis, Send, SyncApis
+from generated_client.batch import run_batch_as_completed, run_batch_sync_as_completed
+from generated_client.cassette import Cassette
+from generated_client.compression import Compression, CompressionMiddleware
+from generated_client.exceptions import CassetteMissError
+from generated_client.pool import PoolConfig
+from generated_client.tracing import StageTimer
+from generated_client.upload import MappedFile
+from generated_client.validation import ValidationPolicy
+from generated_client_split.api_client import ApiClient as SplitApiClient, SyncApis as SplitSyncApis
+from httpx import MockTransport, Request, Response
 from mypy.ipc import TracebackType
+from pydantic import BaseModel
 
 
 class Client(SyncApis):
@@ -23,7 +47,8 @@ class Client(SyncApis):
         return self
 
     def __exit__(self, exc_type: Type[Exception], exc_val: Exception, exc_tb: TracebackType) -> None:
-        get_event_loop().run_until_complete(self.client._async_client.close())
+        get_event_loop().run_until_complete(self.client.aclose())
+        self.client.close()
 
 
 def test_any() -> None:
@@ -36,6 +61,40 @@ def test_any() -> None:
         assert result["hello"] == "world"
 
 
+def test_sync_in_running_loop() -> None:
+    """
+    Sync apis use their own transport, so they must also work while an event loop is running
+    """
+    with Client() as client:
+
+        async def call_sync_api() -> Any:
+            return client.client_api.no_schema()
+
+        result = get_event_loop().run_until_complete(call_sync_api())
+        assert result["hello"] == "world"
+
+
+def test_async_middleware_on_sync_apis() -> None:
+    """
+    Middleware without a `call_sync` method must also run for sync calls, with or without a running event loop
+    """
+    seen: List[str] = []
+
+    async def log_operation(request: Request, call_next: Send) -> Response:
+        seen.append(request.url.path)
+        return await call_next(request)
+
+    with Client() as client:
+        client.client.add_middleware(log_operation)
+
+        async def call_sync_api() -> Any:
+            return client.client_api.no_schema()
+
+        assert client.client_api.no_schema()["hello"] == "world"
+        assert get_event_loop().run_until_complete(call_sync_api())["hello"] == "world"
+        assert len(seen) == 2
+
+
 def _get_file_info() -> Tuple[int, str]:
     """ Return length and hash string from a file """
     with open(__file__, "rb") as file:
@@ -46,6 +105,18 @@ def _get_file_info() -> Tuple[int, str]:
     return length, hash_text
 
 
+def test_lazy_apis() -> None:
+    """
+    Check apis are created on first access, and reused afterwards
+    """
+    apis = SyncApis(ApiClient(host="http://localhost:8000"))
+    assert "client_api" not in vars(apis)
+    assert apis.client_api is apis.client_api
+    assert "client_api" in vars(apis)
+    assert apis.client_api.no_schema() == {"hello": "world"}
+    apis.client.close()
+
+
 def test_file_post() -> None:
     """
     Test files posted as multipart/form.
@@ -70,6 +141,62 @@ def test_file_post() -> None:
             assert ret.content_type.startswith("multipart/form-data")
 
 
+def test_file_post_streamed() -> None:
+    """
+    Check uploads are streamed with a Content-Length, reporting progress, from files and memory-mapped files
+    """
+    length, hash_text = _get_file_info()
+
+    with Client() as client:
+        progress: List[Tuple[Optional[str], int, Optional[int]]] = []
+        client.client.upload_progress = lambda operation_id, sent, total: progress.append((operation_id, sent, total))
+        client.client.upload_chunk_size = 1024
+        with MappedFile(__file__) as file:
+            ret = client.client_api.file_upload(file=file, token="asdf")
+        assert ret.length == length
+        assert ret.hash == hash_text
+        assert len(progress) > length // 1024
+        assert progress[-1][0] == "file_upload"
+        assert progress[-1][1] == progress[-1][2]
+
+        async def upload_async() -> models.FormPostResponse:
+            async_apis = AsyncApis(client.client)
+            with open(__file__, "rb") as file:
+                return await async_apis.client_api.file_upload(file=file)
+
+        assert get_event_loop().run_until_complete(upload_async()).hash == hash_text
+
+
+def test_download(tmp_path: Path) -> None:
+    """
+    Check file responses are returned as bytes, and can be downloaded to a path, a file or a buffer with a checksum
+    """
+    size = 200_000
+    with Client() as client:
+        content = client.client_api.binary_file(size=size)
+        assert isinstance(content, bytes) and len(content) == size
+        checksum = hashlib.sha256(content).hexdigest()
+
+        result = client.client_api.download_binary_file(size=size, destination=tmp_path / "file", checksum="sha256")
+        assert (result.size, result.checksum) == (size, checksum)
+        assert (tmp_path / "file").read_bytes() == content
+        (tmp_path / "reference").write_bytes(b"")
+        assert stat.S_IMODE((tmp_path / "file").stat().st_mode) == stat.S_IMODE((tmp_path / "reference").stat().st_mode)
+
+        buffer = bytearray(size)
+        assert client.client_api.download_binary_file(size=size, destination=buffer).size == size
+        assert buffer == content
+
+        async def download_async() -> bytes:
+            async_apis = AsyncApis(client.client)
+            file = io.BytesIO()
+            result = await async_apis.client_api.download_binary_file(size=size, destination=file, checksum="sha256")
+            assert result.checksum == checksum
+            return file.getvalue()
+
+        assert get_event_loop().run_until_complete(download_async()) == content
+
+
 def test_form_post() -> None:
     """
     Test ordinary forms with no files are sent as application/x-www-form-urlencoded
@@ -91,3 +218,287 @@ def test_list_query() -> None:
     with Client() as client:
         ret = client.client_api.tags_list(tags=tags)
         assert ret.tags == tags
+
+
+def test_path_param_encoding() -> None:
+    """
+    Check path parameters are percent-encoded, so "/", "?" and "%" stay part of the parameter
+    """
+    with Client() as client:
+        result = client.client_api.raw_path(value="a/b?c%d")
+        assert result["raw_path"] == "/raw_path/a%2Fb%3Fc%25d"
+        assert result["value"] == "a/b?c%d"
+        client.client.host = "http://localhost:8000/api/"
+        url = client.client.get_url("/raw_path/{value}", {"value": "a/b"})
+        assert str(url) == "http://localhost:8000/api/raw_path/a%2Fb"
+
+
+def test_stream_list() -> None:
+    """
+    Check list responses can be streamed item by item, with both the sync and async apis
+    """
+    with Client() as client:
+        expected = client.client_api.list_items(count=1000)
+        assert len(expected) == 1000
+        assert list(client.client_api.stream_list_items(count=1000)) == expected
+
+        async def stream_async() -> List[models.ListItem]:
+            async_apis = AsyncApis(client.client)
+            return [item async for item in async_apis.client_api.stream_list_items(count=1000)]
+
+        assert get_event_loop().run_until_complete(stream_async()) == expected
+
+
+def test_pagination() -> None:
+    """
+    Check paginated operations yield the items of all pages, in order, with and without prefetching, also when the
+    server caps the page size
+    """
+    with Client() as client:
+        expected = client.client_api.list_items(count=95)
+        for prefetch in (0, 1, 3):
+            assert list(client.client_api.iter_paged_items(count=95, prefetch=prefetch)) == expected
+            assert list(client.client_api.iter_cursor_items(count=95, limit=20, prefetch=prefetch)) == expected
+            capped = client.client_api.iter_paged_items(count=95, limit=50, max_limit=20, prefetch=prefetch)
+            assert list(capped) == expected  # the server returns fewer items than asked for
+        assert list(client.client_api.iter_paged_items(count=95, offset=90)) == expected[90:]
+        assert list(client.client_api.iter_paged_items(count=0)) == []
+
+        async def iterate_async() -> List[models.ListItem]:
+            async_apis = AsyncApis(client.client)
+            return [item async for item in async_apis.client_api.iter_paged_items(count=95, limit=7, prefetch=2)]
+
+        assert get_event_loop().run_until_complete(iterate_async()) == expected
+
+
+def test_pagination_style() -> None:
+    """
+    Check the `x-pagination` value is passed on as the pagination style, whether it's a style or `true`
+    """
+    with Client() as client:
+        assert '"offset"' in inspect.getsource(client.client_api.iter_paged_items)
+        assert '"true"' in inspect.getsource(client.client_api.iter_cursor_items)
+
+
+def test_split_models(monkeypatch: MonkeyPatch) -> None:
+    """
+    Check a client generated with --split-models imports a model's module when the model is first used, resolving its
+    references to other models (again on the next use if that failed), and calls operations like the other client
+    """
+    assert "generated_client_split.models.cursor_page" not in sys.modules
+
+    def fail_load(name: str) -> Any:
+        raise ImportError(name)
+
+    with monkeypatch.context() as patch:
+        patch.setattr(split_models, "_load", fail_load)
+        with pytest.raises(ImportError):
+            split_models.CursorPage
+    page = split_models.CursorPage(items=[{"index": 0, "name": "item 0"}])
+    assert "generated_client_split.models.cursor_page" in sys.modules
+    assert isinstance(page.items[0], split_models.ListItem)
+
+    with Client() as client:
+        expected = [item.dict() for item in client.client_api.list_items(count=95)]
+    split_apis = SplitSyncApis(SplitApiClient(host="http://localhost:8000", timeout=3600))
+    try:
+        items = split_apis.client_api.iter_cursor_items(count=95, limit=20)
+        assert [item.dict() for item in items] == expected
+    finally:
+        split_apis.client.close()
+
+
+def test_batch() -> None:
+    """
+    Check batches return one result per call, in order, with errors captured per call
+    """
+
+    def failing_call() -> Any:
+        raise ValueError("failed")
+
+    with Client() as client:
+        calls = [partial(client.client_api.list_items, count=count) for count in range(20)]
+        results = client.batch([*calls, failing_call], concurrency=4)
+        assert [len(result.result()) for result in results[:-1]] == list(range(20))
+        assert isinstance(results[-1].error, ValueError)
+
+        async_apis = AsyncApis(client.client)
+        async_calls = (async_apis.client_api.list_items(count=count) for count in range(20))
+        async_results = get_event_loop().run_until_complete(async_apis.batch(async_calls, concurrency=4))
+        assert [result.result() for result in async_results] == [result.result() for result in results[:-1]]
+
+
+def test_batch_stopped_early() -> None:
+    """
+    Check stopping a batch early doesn't take the remaining calls from `calls`, which may be endless
+    """
+
+    async def call(index: int) -> int:
+        return index
+
+    async def first_results() -> List[int]:
+        results = []
+        batch = run_batch_as_completed((call(index) for index in itertools.count()), concurrency=2)
+        async for result in batch:
+            results.append(result.result())
+            if len(results) == 3:
+                break
+        await batch.aclose()
+        return results
+
+    assert len(get_event_loop().run_until_complete(first_results())) == 3
+    results = run_batch_sync_as_completed((partial(int, index) for index in itertools.count()), concurrency=2)
+    assert len(list(itertools.islice(results, 3))) == 3
+
+
+def test_pool_stats() -> None:
+    """
+    Check the pool config is applied, and pool stats are collected for sync requests without replacing the requests'
+    own trace callbacks
+    """
+    events: List[str] = []
+
+    async def add_trace(request: Request, call_next: Send) -> Response:
+        request.extensions["trace"] = lambda event_name, info: events.append(event_name)
+        return await call_next(request)
+
+    client = ApiClient(host="http://localhost:8000", pool=PoolConfig(max_connections=1, collect_stats=True))
+    client.add_middleware(add_trace)
+    apis = SyncApis(client)
+    for _ in range(3):
+        apis.client_api.no_schema()
+    stats = client.get_pool_stats(sync=True)
+    assert stats.requests == 3
+    assert events.count("http11.send_request_headers.started") == 3
+    assert stats.connections_opened == 1
+    assert stats.connections == stats.idle == 1
+    client.close()
+
+
+def test_compression() -> None:
+    """
+    Check request bodies are compressed from the operation's threshold on, and compressed responses are decoded
+    """
+    encodings: List[Tuple[str, Optional[str]]] = []
+
+    def log_request(request: Request) -> None:
+        encodings.append(("request", request.headers.get("Content-Encoding")))
+
+    def log_response(response: Response) -> None:
+        encodings.append(("response", response.headers.get("Content-Encoding")))
+
+    event_hooks = {"request": [log_request], "response": [log_response]}
+    client = ApiClient(host="http://localhost:8000", sync_kwargs={"event_hooks": event_hooks})
+    compression = CompressionMiddleware(
+        Compression("gzip", threshold=1 << 20), operations={"echo_*": Compression(threshold=500)}, accept=["gzip"]
+    )
+    client.add_middleware(compression)
+    apis = SyncApis(client)
+    items = [models.ListItem(index=index, name=f"item {index}") for index in range(100)]
+    assert apis.client_api.echo_items(items) == items
+    assert apis.client_api.echo_items(items[:5]) == items[:5]
+    assert encodings == [("request", "gzip"), ("response", "gzip"), ("request", None), ("response", None)]
+    request = Request("GET", "http://localhost:8000", headers={"Accept-Encoding": "identity"})
+    response = compression.call_sync(request, lambda request: Response(200, request=request))
+    assert response.request.headers["Accept-Encoding"] == "identity"  # the caller's choice is kept
+    client.close()
+
+
+def test_cassette(tmp_path: Path) -> None:
+    """
+    Check responses recorded from the server are replayed, through the middleware, without the server
+    """
+    path = str(tmp_path / "cassette.jsonl.gz")
+    items = [models.ListItem(index=index, name=f"item {index}") for index in range(100)]
+    client = ApiClient(host="http://localhost:8000")
+    client.add_middleware(CompressionMiddleware(Compression(threshold=500)))
+    with Cassette(path, "record") as cassette:
+        client.cassette = cassette
+        apis = SyncApis(client)
+        recorded = [apis.client_api.list_items(count=3), apis.client_api.echo_items(items)]
+    client.close()
+
+    client = ApiClient(host="http://localhost:8000", transport=MockTransport(lambda request: Response(500)))
+    client.add_middleware(CompressionMiddleware(Compression(threshold=500)))
+    with Cassette(path, "replay") as cassette:
+        client.cassette = cassette
+        apis = SyncApis(client)
+        assert [apis.client_api.list_items(count=3), apis.client_api.echo_items(items)] == recorded
+        assert get_event_loop().run_until_complete(AsyncApis(client).client_api.list_items(count=3)) == recorded[0]
+        with pytest.raises(CassetteMissError):
+            apis.client_api.list_items(count=4)
+        for url, other in [("items?a=x&b=y", "items?a=x%26b%3Dy"), ("items/a/b", "items/a%2Fb")]:
+            key = cassette.get_key(Request("GET", f"http://localhost:8000/{url}"))
+            assert key != cassette.get_key(Request("GET", f"http://localhost:8000/{other}"))
+    get_event_loop().run_until_complete(client.aclose())
+    client.close()
+
+
+def test_stage_timer() -> None:
+    """
+    Check each stage of a call is timed under its operation id
+    """
+    with Client() as client:
+        timer = StageTimer()
+        client.client.tracer = timer
+        for _ in range(3):
+            client.client_api.list_items(count=10)
+        assert set(timer.summary()["list_items"]) == {"build", "encode", "send", "decode", "validate"}
+        assert all(count == 3 for count in timer.counts.values())
+
+
+def test_validation_policy() -> None:
+    """
+    Check responses of operations set to construct models without validation equal the validated ones
+    """
+    with Client() as client:
+        expected = client.client_api.list_items(count=10)
+        client.client.operation_validation["list_items"] = ValidationPolicy("construct")
+        assert client.client_api.list_items(count=10) == expected
+        assert list(client.client_api.stream_list_items(count=10)) == expected
+
+
+def test_constructor_build_failure(monkeypatch: MonkeyPatch) -> None:
+    """
+    Check a constructor that failed to build doesn't leave placeholders behind, so it's built again on the next call
+    """
+
+    class Node(BaseModel):
+        name: str
+        children: Optional[List["Node"]] = None
+
+    Node.update_forward_refs(Node=Node)
+
+    def fail_build(model: Any) -> Any:
+        raise RuntimeError("build failed")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(validation, "_build_model_constructor", fail_build)
+        with pytest.raises(RuntimeError):
+            validation.get_constructor(List[Node])
+    nodes = validation.get_constructor(List[Node])([{"name": "a", "children": [{"name": "b"}]}])
+    assert nodes == [Node(name="a", children=[Node(name="b")])]
+
+
+def test_constructor_concurrent_build(monkeypatch: MonkeyPatch) -> None:
+    """
+    Check threads asking for a constructor while another thread builds it get the built constructor
+    """
+
+    class Node(BaseModel):
+        name: str
+        children: Optional[List["Node"]] = None
+
+    Node.update_forward_refs(Node=Node)
+    build_model_constructor = validation._build_model_constructor
+
+    def slow_build(model: Any) -> Any:
+        time.sleep(0.1)
+        return build_model_constructor(model)
+
+    monkeypatch.setattr(validation, "_build_model_constructor", slow_build)
+    data = [{"name": "a", "children": [{"name": "b"}]}]
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        futures = [executor.submit(lambda: validation.get_constructor(List[Node])(data)) for _ in range(2)]
+        results = [future.result() for future in futures]
+    assert results == [[Node(name="a", children=[Node(name="b")])]] * 2
@@ -0,0 +1,199 @@
+"""
+Tests for the middleware shipped with the generated client
+"""
+
+import asyncio
+import threading
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+
+import pytest
+from generated_client.api_client import ApiClient, AsyncApis, Send, SendSync, SyncApis, get_operation_id
+from generated_client.cache import CacheMiddleware
+from generated_client.circuit_breaker import CircuitBreakerMiddleware
+from generated_client.exceptions import CircuitOpenError, UnexpectedResponse
+from generated_client.metrics import Metrics, MetricsMiddleware
+from generated_client.rate_limit import RateLimitMiddleware
+from generated_client.retry import RetryMiddleware
+from generated_client.single_flight import SingleFlightMiddleware
+from httpx import MockTransport, Request, Response
+
+
+def test_cache_revalidation() -> None:
+    """
+    A stale cache entry is revalidated with If-None-Match; the 304 is answered from the cache without re-parsing
+    """
+    client = ApiClient(host="http://localhost:8000")
+    cache_middleware = CacheMiddleware()
+    client.add_middleware(cache_middleware)
+    apis = SyncApis(client)
+
+    first = apis.client_api.etag_resource()
+    second = apis.client_api.etag_resource()
+    assert first == {"hello": "cache"}
+    assert second is first
+    assert len(cache_middleware.cache) == 1
+
+
+def test_single_flight() -> None:
+    """
+    Identical concurrent requests are sent once and share the parsed result
+    """
+    client = ApiClient(host="http://localhost:8000")
+    sent: List[Request] = []
+
+    async def count_requests(request: Request, call_next: Send) -> Response:
+        sent.append(request)
+        await asyncio.sleep(0.05)
+        return await call_next(request)
+
+    client.add_middleware(count_requests)
+    client.add_middleware(SingleFlightMiddleware())
+    apis = AsyncApis(client)
+
+    async def run() -> List[Any]:
+        return await asyncio.gather(*[apis.client_api.etag_resource() for _ in range(5)])
+
+    results = asyncio.get_event_loop().run_until_complete(run())
+    assert len(sent) == 1
+    assert all(result is results[0] for result in results)
+
+
+def test_retry() -> None:
+    """
+    Retryable responses are retried until `max_attempts` is reached
+    """
+    client = ApiClient(host="http://localhost:8000")
+    client.add_middleware(RetryMiddleware(max_attempts=3))
+    apis = SyncApis(client)
+
+    assert apis.client_api.flaky(key=str(uuid.uuid4()), failures=2) == {"attempts": 3}
+    with pytest.raises(UnexpectedResponse) as exc_info:
+        apis.client_api.flaky(key=str(uuid.uuid4()), failures=3)
+    assert exc_info.value.status_code == 503
+
+
+def test_circuit_breaker() -> None:
+    """
+    Once enough requests failed, requests fail fast without reaching the server
+    """
+    client = ApiClient(host="http://localhost:8000")
+    client.add_middleware(CircuitBreakerMiddleware(minimum_calls=3))
+    apis = SyncApis(client)
+    key = str(uuid.uuid4())
+
+    for _ in range(3):
+        with pytest.raises(UnexpectedResponse):
+            apis.client_api.flaky(key=key, failures=10)
+    with pytest.raises(CircuitOpenError):
+        apis.client_api.flaky(key=key, failures=10)
+
+
+def test_rate_limit() -> None:
+    """
+    Requests beyond the burst wait for tokens instead of being sent right away
+    """
+    client = ApiClient(host="http://localhost:8000")
+    client.add_middleware(RateLimitMiddleware(rate=20, burst=1))
+    apis = SyncApis(client)
+
+    start = time.monotonic()
+    for _ in range(5):
+        apis.client_api.no_schema()
+    assert time.monotonic() - start >= 0.2
+
+
+def test_rate_limit_throttle() -> None:
+    """
+    A burst of 429s lowers the rate once per decrease interval; a Retry-After of 0 neither lowers nor pauses it
+    """
+    middleware = RateLimitMiddleware(rate=16)
+    request = Request("GET", "http://localhost:8000/")
+    buckets = middleware.get_buckets(request)
+    for _ in range(5):
+        middleware._update(buckets, Response(429, request=request))
+    assert buckets[0].rate == 8
+    middleware._update(buckets, Response(503, headers={"Retry-After": "0"}, request=request))
+    assert buckets[0].rate == 8
+    assert middleware._reserve(buckets) == 0
+
+
+def test_middleware_scope() -> None:
+    """
+    Middleware limited to some operations only runs for requests of those operations
+    """
+    client = ApiClient(host="http://localhost:8000")
+    operation_ids: List[Optional[str]] = []
+
+    def record_operation(request: Request, call_next: SendSync) -> Response:
+        operation_ids.append(get_operation_id(request))
+        return call_next(request)
+
+    client.add_sync_middleware(record_operation, operations=["list_*"])
+    apis = SyncApis(client)
+    apis.client_api.no_schema()
+    apis.client_api.list_items(count=1)
+    assert operation_ids == ["list_items"]
+
+
+def test_metrics() -> None:
+    """
+    Requests are counted per operation and status code, and exported in the Prometheus text format
+    """
+    client = ApiClient(host="http://localhost:8000")
+    metrics_middleware = MetricsMiddleware()
+    client.add_middleware(metrics_middleware)
+    apis = SyncApis(client)
+
+    for count in range(3):
+        apis.client_api.list_items(count=count)
+    snapshot = metrics_middleware.metrics.snapshot()
+    assert snapshot["list_items"]["count"] == 3
+    assert snapshot["list_items"]["statuses"] == {"200": 3}
+    assert snapshot["list_items"]["latency_percentiles"][0.5] > 0
+    prometheus_text = metrics_middleware.metrics.to_prometheus()
+    assert 'api_client_requests_total{operation="list_items",status="200"} 3' in prometheus_text
+
+
+def test_metrics_retire_thread_counters() -> None:
+    """
+    The counters of threads that have ended are folded together, so short-lived threads don't accumulate
+    """
+    metrics = Metrics()
+    for _ in range(10):
+        thread = threading.Thread(target=metrics.record, args=("list_items", "200", 0.01))
+        thread.start()
+        thread.join()
+    metrics.record("list_items", "200", 0.01)
+    assert len(metrics._shards) == 1
+    assert metrics.snapshot()["list_items"]["statuses"] == {"200": 11}
+
+
+def test_cache_keys() -> None:
+    """
+    Responses are cached per Authorization header, and requests with `Cache-Control: no-cache` are revalidated
+    """
+    sent: List[Request] = []
+
+    def handler(request: Request) -> Response:
+        sent.append(request)
+        if request.headers.get("if-none-match") == '"v1"':
+            return Response(304)
+        headers = {"Cache-Control": "max-age=60", "ETag": '"v1"'}
+        return Response(200, json={"user": request.headers["authorization"]}, headers=headers)
+
+    client = ApiClient(host="http://localhost:8000", transport=MockTransport(handler))
+    client.add_middleware(CacheMiddleware())
+
+    def get(authorization: str, **headers: str) -> Any:
+        headers["Authorization"] = authorization
+        return client.request_sync(type_=Dict[str, str], method="GET", url="/resource", headers=headers)
+
+    assert get("bearer a") == {"user": "bearer a"}
+    assert get("bearer b") == {"user": "bearer b"}
+    assert get("bearer a") == {"user": "bearer a"}
+    assert len(sent) == 2
+    assert get("bearer a", **{"Cache-Control": "no-cache"}) == {"user": "bearer a"}
+    assert len(sent) == 3 and sent[-1].headers["if-none-match"] == '"v1"'
+    client.close()